@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Statically check every widget under one or more output roots and print the
+chapters ranked worst first.
+
+Usage:
+  python3 scripts/audit-widgets.py ./output
+  python3 scripts/audit-widgets.py ./output --top 20 --json audit.json
+  python3 scripts/audit-widgets.py ./output --trace trace/ --profile
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from dataclasses import asdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "lib"))
+
+import pipeline_trace  # noqa: E402
+from widget_audit import audit_chapters  # noqa: E402
+from widget_patch import find_chapters  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Audit generated widgets for broken or fake implementations.")
+    parser.add_argument("roots", nargs="+", help="Output directories to search for chapters/*.html")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--top", type=int, default=None, help="Only print the N worst chapters")
+    parser.add_argument("--json", dest="json_path", help="Also write the full report as JSON")
+    pipeline_trace.add_arguments(parser)
+    args = parser.parse_args()
+
+    pipeline_trace.start(args)
+
+    files = find_chapters(args.roots)
+    start = time.perf_counter()
+    reports = audit_chapters(files, args.jobs)
+    elapsed = time.perf_counter() - start
+
+    flagged = [r for r in reports if r.score]
+    for r in flagged[:args.top]:
+        print(f"[{r.score:3d}] {r.path} ({r.widgets} widgets)")
+        if r.error:
+            print(f"      ERROR {r.error}")
+        for issue in r.issues:
+            print(f"      {issue.severity.upper():7s} #{issue.widget_id}: {issue.message}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump([{**asdict(r), "score": r.score} for r in reports], f, indent=2)
+
+    errors = sum(1 for r in reports for i in r.issues if i.severity == "error") + sum(1 for r in reports if r.error)
+    warnings = sum(1 for r in reports for i in r.issues if i.severity == "warning")
+    widgets = sum(r.widgets for r in reports)
+    print("")
+    print(f"Done! {len(files)} chapters, {widgets} widgets: {len(flagged)} chapter(s) flagged, "
+          f"{errors} error(s), {warnings} warning(s) in {elapsed:.2f}s")
+    pipeline_trace.report(args)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Benchmark the chapter post-processing path on synthetic chapters.
+
+For every combination of widget count and inline-image payload it times
+indexing, in-memory patching and memory-mapped patching, each in a fresh
+process, and reports wall time (best of --repeat), peak RSS growth, Python
+heap peak (from one extra traced run), bytes
+read into and written out of Python buffers, and bytes the kernel copied
+file-to-file (copy_file_range/sendfile) without passing through Python.
+
+The checked-in baseline, bench/baseline.json, was recorded with the default
+cases; its "machine" block says where. Timings only compare meaningfully on
+similar hardware: when the CPU differs from the baseline's, wall-time
+regressions are printed as warnings and only the peak RSS, heap peak and
+bytes read/written checks fail the run. Refresh the baseline (--save) after
+engine changes or when moving the check to another machine, and commit it
+with the change.
+
+Usage:
+  npm run bench:widgets        # compare against bench/baseline.json, exit 1 on regression
+  python3 scripts/bench-chapter-patch.py
+  python3 scripts/bench-chapter-patch.py --save bench/baseline.json
+  python3 scripts/bench-chapter-patch.py --baseline bench/baseline.json --tolerance 0.25
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "lib"))
+
+from chapter_bench import measure, synthetic_chapter  # noqa: E402
+
+OPS = ["index", "patch", "patch-mmap"]
+
+
+def machine_info() -> dict:
+    cpu = platform.processor() or platform.machine()
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            cpu = next(line.split(":", 1)[1].strip() for line in f if line.startswith("model name"))
+    except (OSError, StopIteration):
+        pass
+    return {"cpu": cpu, "cpus": os.cpu_count(), "python": platform.python_version(), "platform": platform.platform()}
+
+
+def int_list(value: str) -> list[int]:
+    return [int(v) for v in value.split(",")]
+
+
+def float_list(value: str) -> list[float]:
+    return [float(v) for v in value.split(",")]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark chapter indexing and widget patching.")
+    parser.add_argument("--widgets", type=int_list, default=[1, 5, 20], help="Widget counts (default: 1,5,20)")
+    parser.add_argument("--image-mb", type=float_list, default=[0, 1, 5, 20],
+                        help="Inline image payload per chapter in MB (default: 0,1,5,20)")
+    parser.add_argument("--ops", default=",".join(OPS), help=f"Operations to run (default: {','.join(OPS)})")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the fastest is kept (default: 3)")
+    parser.add_argument("--save", help="Write results as JSON (e.g. a new baseline)")
+    parser.add_argument("--baseline", help="Compare against a saved baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown / RSS growth vs baseline (default: 0.25)")
+    args = parser.parse_args()
+
+    ops = args.ops.split(",")
+    spawn = multiprocessing.get_context("spawn")
+    results = []
+
+    print(f"{'op':<11} {'widgets':>7} {'image MB':>8} {'file MB':>8} {'wall ms':>9} {'peak RSS MB':>11} {'heap MB':>8} "
+          f"{'read MB':>8} {'write MB':>8} {'kernel MB':>9}")
+    with tempfile.TemporaryDirectory(prefix="cb-bench-") as tmp:
+        for image_mb in args.image_mb:
+            for widgets in args.widgets:
+                template = os.path.join(tmp, f"w{widgets}-i{image_mb}.html")
+                with open(template, "wb") as f:
+                    f.write(synthetic_chapter(widgets, int(image_mb * (1 << 20))))
+                for op in ops:
+                    runs = []
+                    for n in range(args.repeat + 1):
+                        with ProcessPoolExecutor(1, mp_context=spawn) as pool:
+                            runs.append(pool.submit(measure, op, template, widgets, image_mb, n == 0).result())
+                    traced, runs = runs[0], runs[1:]
+                    best = min(runs, key=lambda m: m.wall_s)
+                    best.peak_rss_kb = max(m.peak_rss_kb for m in runs)
+                    best.heap_peak_kb = traced.heap_peak_kb
+                    results.append(best)
+                    print(f"{op:<11} {widgets:>7} {image_mb:>8g} {best.file_bytes / (1 << 20):>8.2f} "
+                          f"{best.wall_s * 1000:>9.2f} {best.peak_rss_kb / 1024:>11.2f} {best.heap_peak_kb / 1024:>8.2f} "
+                          f"{best.bytes_read / (1 << 20):>8.2f} {best.bytes_written / (1 << 20):>8.2f} "
+                          f"{best.bytes_copied / (1 << 20):>9.2f}")
+
+    report = {
+        "machine": machine_info(),
+        "cases": [asdict(m) for m in results],
+    }
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved {len(results)} case(s) to {args.save}")
+
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        saved = json.load(f)
+    baseline = {(c["op"], c["widgets"], c["image_mb"]): c for c in saved["cases"]}
+    same_cpu = saved.get("machine", {}).get("cpu") == report["machine"]["cpu"]
+    if not same_cpu:
+        print(f"\n  Note: baseline was recorded on {saved.get('machine', {}).get('cpu', 'an unknown CPU')}; "
+              f"wall-time differences are reported as warnings only")
+    regressions, warnings = [], []
+    for m in results:
+        base = baseline.get((m.op, m.widgets, m.image_mb))
+        if not base:
+            continue
+        # Small absolute floors keep sub-millisecond / sub-MB noise from failing the run.
+        if m.wall_s > max(base["wall_s"] * (1 + args.tolerance), base["wall_s"] + 0.002):
+            (regressions if same_cpu else warnings).append(
+                f"{m.op} w={m.widgets} img={m.image_mb:g}MB: "
+                f"wall {base['wall_s'] * 1000:.2f} -> {m.wall_s * 1000:.2f} ms")
+        if m.peak_rss_kb > max(base["peak_rss_kb"] * (1 + args.tolerance), base["peak_rss_kb"] + 1024):
+            regressions.append(f"{m.op} w={m.widgets} img={m.image_mb:g}MB: "
+                               f"peak RSS {base['peak_rss_kb'] / 1024:.1f} -> {m.peak_rss_kb / 1024:.1f} MB")
+        if m.heap_peak_kb > max(base["heap_peak_kb"] * (1 + args.tolerance), base["heap_peak_kb"] + 1024):
+            regressions.append(f"{m.op} w={m.widgets} img={m.image_mb:g}MB: "
+                               f"heap peak {base['heap_peak_kb'] / 1024:.1f} -> {m.heap_peak_kb / 1024:.1f} MB")
+        # Bytes moved through Python buffers do not depend on the machine, so they always gate.
+        for key, label in (("bytes_read", "bytes read"), ("bytes_written", "bytes written")):
+            if getattr(m, key) > max(base[key] * (1 + args.tolerance), base[key] + 65536):
+                regressions.append(f"{m.op} w={m.widgets} img={m.image_mb:g}MB: "
+                                   f"{label} {base[key] / (1 << 20):.2f} -> {getattr(m, key) / (1 << 20):.2f} MB")
+
+    print("")
+    for line in warnings:
+        print(f"  WARNING {line}")
+    for line in regressions:
+        print(f"  REGRESSION {line}")
+    print(f"Done! {len(regressions)} regression(s), {len(warnings)} timing warning(s) against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
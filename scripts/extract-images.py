@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Move inline base64 images out of published chapters into publish/img/,
+named by content hash, and point each <img src> at the stored file.
+
+Run after publish-course.ts (and after any widget patches).
+
+Usage:
+  python3 scripts/extract-images.py ./output/prejudice_v2
+  python3 scripts/extract-images.py ./output --jobs 8
+  python3 scripts/extract-images.py ./output --trace trace/ --profile
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "lib"))
+
+import pipeline_trace  # noqa: E402
+from build_state import find_publish_dirs  # noqa: E402
+from image_assets import extract_images  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Extract inline images from published chapters.")
+    parser.add_argument("roots", nargs="+", help="Course output directories (or parents of them)")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    pipeline_trace.add_arguments(parser)
+    args = parser.parse_args()
+
+    pipeline_trace.start(args)
+
+    tasks = []
+    for publish_dir in find_publish_dirs(args.roots):
+        img_dir = os.path.join(publish_dir, "img")
+        os.makedirs(img_dir, exist_ok=True)
+        chapters_dir = os.path.join(publish_dir, "chapters")
+        for name in sorted(os.listdir(chapters_dir)):
+            if name.endswith(".html"):
+                tasks.append((os.path.join(chapters_dir, name), img_dir))
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(args.jobs) as pool:
+        results = list(pool.map(extract_images, *zip(*tasks), [args.dry_run] * len(tasks))) if tasks else []
+    elapsed = time.perf_counter() - start
+
+    failed = [r for r in results if r.error]
+    for r in results:
+        if r.images and not r.error:
+            print(f"  {r.path}: {r.images} image(s), {r.bytes_before:,} -> {r.bytes_after:,} bytes")
+    for r in failed:
+        print(f"  FAILED {r.path}: {r.error}", file=sys.stderr)
+
+    images = sum(r.images for r in results)
+    assets = len({a for r in results for a in r.assets})
+    before = sum(r.bytes_before for r in results)
+    after = sum(r.bytes_after for r in results)
+    print("")
+    print(f"Done! {images} inline image(s) -> {assets} unique asset(s); "
+          f"chapters {before:,} -> {after:,} bytes in {elapsed:.2f}s")
+    pipeline_trace.report(args)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,29 @@
 #!/usr/bin/env python3
-"""Replace the two problematic widgets in leadership ch05 with non-fake-grading versions."""
+"""Replace the two problematic widgets in leadership ch05 with non-fake-grading versions.
 
-FILE = "output/leadership-through-crisis/chapters/05_speaking-into-the-void.html"
+This file is a patch spec for scripts/patch-widgets.py (it defines PATCHES):
 
-with open(FILE, "r") as f:
-    html = f.read()
+  python3 scripts/patch-widgets.py scripts/fix-ch05-widgets.py ./output/leadership-through-crisis
 
-# ── 1. Replace Widget 1 container HTML ──────────────────────────────────────
+Each patch is guarded (path glob plus the original widget title, as the old
+`assert old_container in html` checks were), so pointing it at a wider tree
+never rewrites another course's `widget-drafting-room` or `widget-splitter`.
 
-old_container1 = '''    <div class="widget-container" id="widget-drafting-room">
-      <h3 style="margin-top:0;">\U0001f58a\ufe0f Crisis Statement Drafting Room</h3>
-      <p style="font-size:0.9rem;color:var(--text-secondary);">You are the communications lead. Draft a public statement (max 150 words) based on the scenario below. Reference the examples for guidance \u2014 but do not copy them. You have three attempts.</p>
-      <div id="dr-content">Loading widget...</div>
-    </div>'''
+Run directly, it patches the single chapter it was written for (set
+CLASSBUILD_TRACE=<dir> to get a stage timing trace, see lib/pipeline_trace.py).
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "lib"))
+
+import pipeline_trace  # noqa: E402
+from widget_patch import WidgetPatch, patch_file  # noqa: E402
+
+FILE = "output/leadership-through-crisis/chapters/05_speaking-into-the-void.html"
+
+# ── Widget 1 container HTML ─────────────────────────────────────────────────
 
 new_container1 = '''    <div class="widget-container" id="widget-drafting-room">
       <h3 style="margin-top:0;">\U0001f52c Crisis Statement Autopsy</h3>
@@ -20,16 +31,7 @@ new_container1 = '''    <div class="widget-container" id="widget-drafting-room">
       <div id="dr-content">Loading widget...</div>
     </div>'''
 
-assert old_container1 in html, "Could not find Widget 1 container HTML"
-html = html.replace(old_container1, new_container1)
-
-# ── 2. Replace Widget 3 container HTML ──────────────────────────────────────
-
-old_container3 = '''    <div class="widget-container" id="widget-splitter">
-      <h3 style="margin-top:0;">\U0001f500 Internal vs. External Message Splitter</h3>
-      <p style="font-size:0.9rem;color:var(--text-secondary);">You\'ve received a crisis update. Draft two versions of the same message: one for your internal team, one for the public. After submitting, see how well each message is calibrated for its audience \u2014 and whether the two would survive being seen together.</p>
-      <div id="sp-content">Loading widget...</div>
-    </div>'''
+# ── Widget 3 container HTML ─────────────────────────────────────────────────
 
 new_container3 = '''    <div class="widget-container" id="widget-splitter">
       <h3 style="margin-top:0;">\U0001f500 Message Leak Test</h3>
@@ -37,22 +39,7 @@ new_container3 = '''    <div class="widget-container" id="widget-splitter">
       <div id="sp-content">Loading widget...</div>
     </div>'''
 
-assert old_container3 in html, "Could not find Widget 3 container HTML"
-html = html.replace(old_container3, new_container3)
-
-# ── 3. Replace Widget 1 script block ────────────────────────────────────────
-# Use string find/splice instead of regex to avoid escape issues
-
-marker1_start = "  <!-- Widget 1: Crisis Statement Drafting Room -->\n  <script>\n"
-marker1_end_before = "\n\n  <!-- Widget 2: Trust Erosion Simulator -->"
-
-idx1_start = html.index(marker1_start)
-idx1_content_start = idx1_start + len(marker1_start)
-
-# Find the </script> that comes before Widget 2
-idx1_widget2 = html.index(marker1_end_before)
-# Search backwards from Widget 2 marker to find </script>
-idx1_script_end = html.rindex("</script>", idx1_content_start, idx1_widget2)
+# ── Widget 1 script block ───────────────────────────────────────────────────
 
 NEW_WIDGET1_JS = r"""(function() {
     try {
@@ -212,19 +199,7 @@ NEW_WIDGET1_JS = r"""(function() {
     }
   })();"""
 
-html = html[:idx1_content_start] + NEW_WIDGET1_JS + "\n  " + html[idx1_script_end:]
-
-print("Replaced Widget 1 script block")
-
-# ── 4. Replace Widget 3 script block ────────────────────────────────────────
-
-marker3_start = "  <!-- Widget 3: Internal vs External Message Splitter -->\n  <script>\n"
-
-idx3_start = html.index(marker3_start)
-idx3_content_start = idx3_start + len(marker3_start)
-
-# Find the last </script> in the file (Widget 3 is the last script block)
-idx3_script_end = html.rindex("</script>")
+# ── Widget 3 script block ───────────────────────────────────────────────────
 
 NEW_WIDGET3_JS = r"""(function() {
     try {
@@ -373,14 +348,22 @@ NEW_WIDGET3_JS = r"""(function() {
     }
   })();"""
 
-html = html[:idx3_content_start] + NEW_WIDGET3_JS + "\n  " + html[idx3_script_end:]
-
-print("Replaced Widget 3 script block")
-
-# ── Write the file ──────────────────────────────────────────────────────────
-
-with open(FILE, "w") as f:
-    f.write(html)
-
-print("Done! Replaced both widgets in", FILE)
-print(f"File size: {len(html):,} bytes")
+CHAPTER_GLOB = "*/leadership-through-crisis/chapters/05_*.html"
+
+PATCHES = [
+    WidgetPatch("widget-drafting-room", new_container1, NEW_WIDGET1_JS,
+                expect="Crisis Statement Drafting Room", path_glob=CHAPTER_GLOB),
+    WidgetPatch("widget-splitter", new_container3, NEW_WIDGET3_JS,
+                expect="Internal vs. External Message Splitter", path_glob=CHAPTER_GLOB),
+]
+
+if __name__ == "__main__":
+    result = patch_file(FILE, PATCHES)
+    if result.error or result.missing:
+        sys.exit(f"Could not patch {FILE}: {result.error or 'missing ' + ', '.join(result.missing)}")
+
+    print("Done! Replaced both widgets in", FILE)
+    print(f"File size: {result.size:,} bytes")
+    summary = pipeline_trace.finish()
+    if summary:
+        print(summary)
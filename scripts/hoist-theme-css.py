@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Replace the identical inline theme <style> block in published chapters with a
+<link> to one shared, content-hashed publish/theme.<hash>.css.
+
+Run after publish-course.ts (and after any widget patches).
+
+Usage:
+  python3 scripts/hoist-theme-css.py ./output/prejudice_v2
+  python3 scripts/hoist-theme-css.py ./output --min-share 3 --dry-run
+  python3 scripts/hoist-theme-css.py ./output --trace trace/
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "lib"))
+
+import pipeline_trace  # noqa: E402
+from build_state import find_publish_dirs  # noqa: E402
+from theme_css import find_theme_style, group_blocks, link_stylesheet, write_stylesheet  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Hoist shared chapter theme CSS into one cached file.")
+    parser.add_argument("roots", nargs="+", help="Course output directories (or parents of them)")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--min-share", type=int, default=2,
+                        help="Only hoist a stylesheet shared by at least this many chapters (default: 2)")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    pipeline_trace.add_arguments(parser)
+    args = parser.parse_args()
+
+    pipeline_trace.start(args)
+
+    start = time.perf_counter()
+    results = []
+    failed: list[tuple[str, str]] = []
+    with ProcessPoolExecutor(args.jobs) as pool:
+        for publish_dir in find_publish_dirs(args.roots):
+            chapters_dir = os.path.join(publish_dir, "chapters")
+            files = [os.path.join(chapters_dir, n) for n in sorted(os.listdir(chapters_dir)) if n.endswith(".html")]
+            blocks = [b for b in pool.map(find_theme_style, files) if b]
+            failed += [(b.path, b.error) for b in blocks if b.error]
+
+            for group in group_blocks(blocks, args.min_share).values():
+                print(f"  {publish_dir}: {len(group)} chapter(s) share a {group[0].size:,}-byte stylesheet")
+                if args.dry_run:
+                    continue
+                try:
+                    stylesheet = write_stylesheet(group[0], publish_dir)
+                except OSError as e:
+                    failed.append((publish_dir, str(e)))
+                    continue
+                results += pool.map(link_stylesheet, group, [stylesheet] * len(group))
+    elapsed = time.perf_counter() - start
+
+    failed += [(r.path, r.error) for r in results if r.error]
+    linked = [r for r in results if not r.error]
+    for path, error in failed:
+        print(f"  FAILED {path}: {error}", file=sys.stderr)
+
+    print("")
+    print(f"Done! Linked {len(linked)} chapter(s) to shared stylesheets, "
+          f"{sum(r.bytes_before - r.bytes_after for r in linked):,} inline bytes removed, "
+          f"{len(failed)} failed in {elapsed:.2f}s")
+    pipeline_trace.report(args)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Build (or refresh) the widget index sidecars for every chapter under one or
+more output roots, so later patch/audit/extract runs can seek straight to a
+widget.
+
+Usage:
+  python3 scripts/index-chapters.py ./output
+  python3 scripts/index-chapters.py ./output/course-a --show
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "lib"))
+
+from chapter_index import load_index  # noqa: E402
+from widget_patch import find_chapters  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Index widget offsets in chapter HTML.")
+    parser.add_argument("roots", nargs="+", help="Output directories to search for chapters/*.html")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--show", action="store_true", help="Print each widget's offsets")
+    args = parser.parse_args()
+
+    files = find_chapters(args.roots)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(args.jobs) as pool:
+        indexes = list(pool.map(load_index, files, chunksize=max(1, len(files) // 64)))
+    elapsed = time.perf_counter() - start
+
+    total = 0
+    for path, index in zip(files, indexes):
+        total += len(index.widgets)
+        if not args.show:
+            continue
+        print(f"{path} ({index.size:,} bytes, {index.sha256[:12]})")
+        for w in index.widgets:
+            script = f"script {w.body[0]}-{w.body[1]}" if w.body else "NO SCRIPT"
+            print(f"  #{w.widget_id} [{w.number or '?'}: {w.title or ''}] "
+                  f"container {w.container[0]}-{w.container[1]}, {script}")
+
+    print(f"Done! Indexed {total} widgets in {len(files)} chapters in {elapsed:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
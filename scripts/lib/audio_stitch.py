@@ -0,0 +1,263 @@
+"""
+Re-stitch and re-level chapter audiobooks with vectorized NumPy.
+
+tts.ts joins Gemini's PCM chunks in per-sample JavaScript loops
+(concatPcm / crossfadePcm / joinPcmWithCrossfade / pcmToWav). This module does
+the same job for the files in a course's `audio/` directory:
+
+  audio/01_chunk00.wav, audio/01_chunk01.pcm, ...  -> stitched into audio/01.wav
+  audio/01.wav (no chunks)                         -> re-leveled in place
+
+Every input is memory-mapped as an int16 array and processed in blocks of
+BLOCK_FRAMES, so memory stays bounded by the block size however long the
+chapter is. Chunk boundaries get the same equal-power (cos/sin) crossfade as
+crossfadePcm. Loudness normalization is a single RMS gain per chapter towards
+`target_dbfs`, capped so the loudest sample stays under PEAK_CEILING; it is a
+plain RMS level, not an ITU-R BS.1770 (LUFS) measurement.
+
+numpy is a hard dependency, declared in scripts/requirements.txt.
+"""
+
+import os
+import re
+import struct
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from pipeline_trace import file_scope, span
+
+# Gemini TTS returns 24 kHz / 16-bit / mono PCM (see src/services/gemini/tts.ts).
+SAMPLE_RATE = 24000
+CHANNELS = 1
+CROSSFADE_MS = 80
+
+BLOCK_FRAMES = 1 << 18
+PEAK_CEILING = 0.98
+INT16_MAX = 32767
+
+AUDIO_RE = re.compile(r"^(\d+)(?:_chunk(\d+))?\.(wav|pcm)$", re.IGNORECASE)
+
+
+class AudioError(Exception):
+    pass
+
+
+@dataclass
+class Source:
+    path: str
+    offset: int
+    frames: int
+    sample_rate: int
+    channels: int
+
+    def samples(self) -> np.ndarray:
+        """The source as a read-only (frames, channels) int16 memory map."""
+        if not self.frames:
+            return np.zeros((0, self.channels), dtype="<i2")
+        return np.memmap(self.path, dtype="<i2", mode="r", offset=self.offset,
+                         shape=(self.frames, self.channels))
+
+
+@dataclass
+class StitchResult:
+    prefix: str
+    dest: str
+    inputs: list[str] = field(default_factory=list)
+    frames: int = 0
+    seconds: float = 0.0
+    gain_db: float = 0.0
+    error: str | None = None
+
+
+def open_source(path: str, sample_rate: int = SAMPLE_RATE, channels: int = CHANNELS) -> Source:
+    """Locate the sample data of a 16-bit PCM WAV, or treat a .pcm file as raw."""
+    if path.lower().endswith(".pcm"):
+        return Source(path, 0, os.path.getsize(path) // (2 * channels), sample_rate, channels)
+
+    with open(path, "rb") as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+            raise AudioError(f"{path} is not a RIFF/WAVE file")
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise AudioError(f"{path} has no data chunk")
+            chunk_id, size = header[:4], struct.unpack("<I", header[4:])[0]
+            if chunk_id == b"fmt ":
+                fmt = struct.unpack("<HHIIHH", f.read(16))
+                f.seek(size - 16 + (size & 1), os.SEEK_CUR)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise AudioError(f"{path} has data before its fmt chunk")
+                audio_format, ch, rate, _, _, bits = fmt
+                if audio_format != 1 or bits != 16:
+                    raise AudioError(f"{path} is not 16-bit PCM (format {audio_format}, {bits} bits)")
+                offset = f.tell()
+                # Streaming writers leave 0 / 0xFFFFFFFF here; trust the file size instead.
+                available = os.path.getsize(path) - offset
+                size = available if size in (0, 0xFFFFFFFF) else min(size, available)
+                return Source(path, offset, size // (2 * ch), rate, ch)
+            else:
+                f.seek(size + (size & 1), os.SEEK_CUR)
+
+
+def wav_header(frames: int, sample_rate: int, channels: int) -> bytes:
+    """A 44-byte RIFF/WAVE header, as pcmToWav writes."""
+    block_align = channels * 2
+    data_size = frames * block_align
+    return (
+        b"RIFF" + struct.pack("<I", 36 + data_size) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, sample_rate * block_align, block_align, 16)
+        + b"data" + struct.pack("<I", data_size)
+    )
+
+
+def find_audio_dirs(roots: list[str]) -> list[str]:
+    """Every course `audio/` directory under the given roots (publish/ copies excluded)."""
+    found = set()
+    for root in roots:
+        for dirpath, dirnames, _ in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".") and d not in ("node_modules", "publish")]
+            if os.path.basename(dirpath) == "audio":
+                found.add(dirpath)
+    return sorted(found)
+
+
+def chapter_inputs(audio_dir: str) -> dict[str, list[str]]:
+    """Map chapter prefix -> ordered input files (chunks if present, else the chapter WAV)."""
+    chunks: dict[str, list[tuple[int, str]]] = {}
+    whole: dict[str, str] = {}
+    for name in os.listdir(audio_dir):
+        m = AUDIO_RE.match(name)
+        if not m:
+            continue
+        prefix, index = m.group(1), m.group(2)
+        path = os.path.join(audio_dir, name)
+        if index is None:
+            if name.lower().endswith(".wav"):
+                whole[prefix] = path
+        else:
+            chunks.setdefault(prefix, []).append((int(index), path))
+    inputs = {prefix: [p for _, p in sorted(items)] for prefix, items in chunks.items()}
+    for prefix, path in whole.items():
+        inputs.setdefault(prefix, [path])
+    return dict(sorted(inputs.items()))
+
+
+# ── Analysis ────────────────────────────────────────────────────────────────
+
+def measure_level(sources: list[Source]) -> tuple[float, int]:
+    """(RMS, peak) over every sample of `sources`, in int16 units, block by block."""
+    total = 0.0
+    count = 0
+    peak = 0
+    for src in sources:
+        samples = src.samples()
+        for start in range(0, src.frames, BLOCK_FRAMES):
+            block = samples[start:start + BLOCK_FRAMES].astype(np.float64)
+            total += float(np.dot(block.ravel(), block.ravel()))
+            count += block.size
+            if block.size:
+                peak = max(peak, int(np.abs(block).max()))
+    return (float(np.sqrt(total / count)) if count else 0.0), peak
+
+
+def normalization_gain(rms: float, peak: int, target_dbfs: float) -> float:
+    """Linear gain that brings `rms` to `target_dbfs`, limited by the peak ceiling."""
+    if rms <= 0 or peak <= 0:
+        return 1.0
+    gain = INT16_MAX * 10 ** (target_dbfs / 20) / rms
+    return min(gain, PEAK_CEILING * INT16_MAX / peak)
+
+
+def plan_fades(sources: list[Source], fade_frames: int) -> list[int]:
+    """Crossfade length for each boundary between consecutive sources.
+
+    Like crossfadePcm, a boundary falls back to a plain join when a side is
+    too short; here a chunk must also be long enough to give up both its head
+    and its tail.
+    """
+    fades = []
+    used_head = 0
+    for prev, nxt in zip(sources, sources[1:]):
+        fade = fade_frames if prev.frames - used_head >= fade_frames and nxt.frames >= fade_frames else 0
+        fades.append(fade)
+        used_head = fade
+    return fades
+
+
+# ── Stitching ───────────────────────────────────────────────────────────────
+
+def _to_int16(block: np.ndarray, gain: float) -> bytes:
+    if gain != 1.0:
+        block = block * gain
+    return np.clip(np.rint(block), -32768, INT16_MAX).astype("<i2").tobytes()
+
+
+def stitch(sources: list[Source], dest: str, fade_frames: int = 0, gain: float = 1.0, gap_frames: int = 0) -> int:
+    """Write `sources` joined (crossfaded, gained, optionally gapped) as a WAV. Returns frames.
+
+    Writes to a temporary file first, so `dest` may be one of the sources.
+    """
+    if not sources:
+        raise AudioError(f"Nothing to stitch into {dest}")
+    rate, channels = sources[0].sample_rate, sources[0].channels
+    for src in sources:
+        if (src.sample_rate, src.channels) != (rate, channels):
+            raise AudioError(
+                f"{src.path} is {src.sample_rate} Hz / {src.channels} ch, "
+                f"expected {rate} Hz / {channels} ch"
+            )
+
+    fades = plan_fades(sources, fade_frames) if fade_frames else [0] * (len(sources) - 1)
+    frames = sum(s.frames for s in sources) - sum(fades) + gap_frames * (len(sources) - 1)
+    t = np.arange(fade_frames, dtype=np.float64) / fade_frames if fade_frames else np.zeros(0)
+    fade_out = np.cos(t * np.pi / 2)[:, None]
+    fade_in = np.sin(t * np.pi / 2)[:, None]
+    silence = bytes(gap_frames * channels * 2)
+
+    tmp = dest + ".tmp"
+    with open(tmp, "wb") as out:
+        out.write(wav_header(frames, rate, channels))
+        for i, src in enumerate(sources):
+            samples = src.samples()
+            head = fades[i - 1] if i > 0 else 0
+            tail = fades[i] if i < len(fades) else 0
+
+            if head:
+                prev = sources[i - 1].samples()[-head:].astype(np.float64)
+                mixed = prev * fade_out[:head] + samples[:head].astype(np.float64) * fade_in[:head]
+                out.write(_to_int16(mixed, gain))
+            elif i > 0 and gap_frames:
+                out.write(silence)
+
+            for start in range(head, src.frames - tail, BLOCK_FRAMES):
+                stop = min(start + BLOCK_FRAMES, src.frames - tail)
+                out.write(_to_int16(samples[start:stop].astype(np.float64), gain))
+            del samples
+    os.replace(tmp, dest)
+    return frames
+
+
+def stitch_chapter(prefix: str, inputs: list[str], dest: str, crossfade_ms: float = CROSSFADE_MS,
+                   target_dbfs: float | None = -20.0) -> StitchResult:
+    """Stitch one chapter's chunks (or re-level its WAV) into `dest`. Meant for a pool worker."""
+    result = StitchResult(prefix, dest, list(inputs))
+    with file_scope(dest):
+        try:
+            sources = [open_source(p) for p in inputs]
+            gain = 1.0
+            if target_dbfs is not None:
+                with span("measure"):
+                    rms, peak = measure_level(sources)
+                gain = normalization_gain(rms, peak, target_dbfs)
+            fade_frames = int(crossfade_ms / 1000 * sources[0].sample_rate)
+            with span("stitch"):
+                result.frames = stitch(sources, dest, fade_frames, gain)
+            result.seconds = result.frames / sources[0].sample_rate
+            result.gain_db = 20 * float(np.log10(gain))
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+    return result
@@ -0,0 +1,53 @@
+"""
+On-disk state shared by the chapter post-processing stages.
+
+The patch and precompress manifests are both a versioned JSON object with one
+section of entries, loaded leniently (a missing, unreadable or older file just
+means "nothing recorded") and replaced atomically on save. JsonManifest holds
+that persistence; subclasses pick the file, the section name and the entry
+layout. find_publish_dirs() is the walker the publish/ stages use to find
+their inputs.
+"""
+
+import json
+import os
+
+
+def find_publish_dirs(roots: list[str]) -> list[str]:
+    """Every `publish/` directory (one holding `chapters/`) under the given roots."""
+    found = set()
+    for root in roots:
+        for dirpath, dirnames, _ in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".") and d != "node_modules"]
+            if os.path.basename(dirpath) == "publish" and "chapters" in dirnames:
+                found.add(dirpath)
+                dirnames[:] = []
+    return sorted(found)
+
+
+class JsonManifest:
+    """`{"version": VERSION, SECTION: {...}}` at `path`, saved only when dirty."""
+
+    VERSION = 1
+    SECTION = "entries"
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: dict[str, dict] = {}
+        self.dirty = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            if raw.get("version") == self.VERSION:
+                self.entries = raw[self.SECTION]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, self.SECTION: self.entries}, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+        self.dirty = False
@@ -0,0 +1,202 @@
+"""
+Synthetic chapters and per-operation measurements for the post-processing
+benchmarks (scripts/bench-chapter-patch.py).
+
+synthetic_chapter() follows the layout src/prompts/chapter.ts asks for: theme
+`<style>` block, header, hook box, sections with `.widget-container` divs and
+`<figure>` images carrying inline base64 payloads, the progress-bar script,
+then one `<!-- Widget N: ... -->` comment and IIFE per widget before `</body>`.
+
+Each measurement runs in a fresh spawned process so peak RSS belongs to that
+operation alone. Peak RSS includes file pages touched through a memory map, so
+every case is also measured for Python heap peak (tracemalloc), in a separate
+run since tracing distorts timings.
+"""
+
+import base64
+import os
+import random
+import shutil
+import time
+import tracemalloc
+from dataclasses import dataclass
+
+from chapter_index import INDEX_DIR, load_index
+from pipeline_trace import peak_rss, reset_peak_rss
+from widget_patch import COUNTERS, WidgetPatch, patch_file
+
+THEME_CSS = """
+  *, *::before, *::after { margin: 0; padding: 0; box-sizing: border-box; }
+  :root { --page-bg: #0f0f1a; --card-bg: #1a1a2e; --elevated: #252540; --accent: #8b5cf6; }
+  body { font-family: 'Inter', sans-serif; background: var(--page-bg); color: var(--text-primary); }
+  .container { max-width: 800px; margin: 0 auto; padding: 3rem 2rem; }
+  .widget-container {
+    background: var(--card-bg); border: 1px solid #8b5cf620;
+    border-radius: 12px; padding: 1.5rem; margin: 2rem 0;
+  }
+  .widget-container input[type="range"] { width: 100%; height: 6px; border-radius: 3px; }
+  .widget-container button { background: var(--accent); color: #fff; border: none; cursor: pointer; }
+  .widget-container button:hover { opacity: 0.85; }
+  .widget-container select,
+  .widget-container input[type="text"],
+  .widget-container input[type="number"] { background: var(--elevated); border-radius: 6px; }
+  .widget-container ::-webkit-scrollbar { width: 8px; height: 8px; }
+"""
+
+PARAGRAPH = (
+    "Crisis communication research consistently shows that early, specific and empathetic "
+    "statements preserve trust better than delayed or defensive ones (Coombs, 2007). "
+)
+
+
+def widget_id(n: int) -> str:
+    return f"widget-bench-{n}"
+
+
+def widget_js(n: int, variant: str = "v1") -> str:
+    return f"""(function() {{
+    try {{
+      var container = document.getElementById('wb{n}-content');
+      var state = {{ count: 0, variant: '{variant}' }};
+      function render() {{
+        var html = '<p>Widget {n} ({variant}): ' + state.count + '</p>';
+        html += '<button id="wb{n}-btn">Next</button>';
+        container.innerHTML = html;
+        document.getElementById('wb{n}-btn').addEventListener('click', function() {{
+          state.count += 1;
+          render();
+        }});
+      }}
+      render();
+    }} catch(e) {{
+      document.getElementById('wb{n}-content').innerHTML = '<p style="color:var(--text-secondary);font-style:italic;">Interactive widget could not load.</p>';
+    }}
+  }})();"""
+
+
+def widget_container(n: int, title: str = "Benchmark Widget") -> str:
+    return f"""<div class="widget-container" id="{widget_id(n)}">
+      <h3 style="margin-top:0;">{title} {n}</h3>
+      <p style="font-size:0.9rem;color:var(--text-secondary);">Synthetic widget for benchmarking.</p>
+      <div id="wb{n}-content">Loading widget...</div>
+    </div>"""
+
+
+def synthetic_chapter(widgets: int, image_bytes: int, seed: int = 0) -> bytes:
+    """A chapter with `widgets` widgets and about `image_bytes` of inline images."""
+    rng = random.Random(seed)
+    n_images = min(3, max(1, image_bytes // (4 << 20) + 1)) if image_bytes else 0
+    sections = max(widgets, n_images, 1)
+
+    body = []
+    for s in range(sections):
+        body.append(f"    <h2>Section {s + 1}</h2>\n    <p>{PARAGRAPH * 6}</p>")
+        if s < n_images:
+            raw = rng.randbytes(image_bytes * 3 // 4 // n_images)
+            body.append(
+                '    <figure style="margin:2rem 0;text-align:center"><img src="data:image/png;base64,'
+                + base64.b64encode(raw).decode()
+                + f'" alt="Figure {s + 1}" style="max-width:100%;border-radius:12px;">'
+                f"<figcaption>Figure {s + 1}</figcaption></figure>"
+            )
+        if s < widgets:
+            body.append("    " + widget_container(s + 1))
+
+    scripts = "\n\n".join(
+        f"  <!-- Widget {n + 1}: Benchmark Widget {n + 1} -->\n  <script>\n  {widget_js(n + 1)}\n  </script>"
+        for n in range(widgets)
+    )
+
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="UTF-8">
+<title>Benchmark Chapter</title>
+<style>{THEME_CSS}</style>
+</head>
+<body>
+  <div id="progress-bar"></div>
+  <div class="container">
+    <header class="chapter-header">
+      <div class="chapter-label">Class 1</div>
+      <h1 class="chapter-title">Benchmark Chapter</h1>
+    </header>
+    <div class="hook-box"><p>{PARAGRAPH}</p></div>
+{chr(10).join(body)}
+  </div>
+
+  <script>
+    window.addEventListener('scroll', () => {{
+      const h = document.documentElement;
+      const pct = (h.scrollTop / (h.scrollHeight - h.clientHeight)) * 100;
+      document.getElementById('progress-bar').style.width = pct + '%';
+    }});
+  </script>
+{scripts}
+</body>
+</html>
+""".encode("utf-8")
+
+
+def bench_patches(widgets: int) -> list[WidgetPatch]:
+    """Replace every other widget (at least one), container and script."""
+    return [
+        WidgetPatch(widget_id(n), widget_container(n, "Patched Widget"), widget_js(n, "v2"))
+        for n in range(1, widgets + 1, 2)
+    ]
+
+
+# ── Measurement ─────────────────────────────────────────────────────────────
+
+@dataclass
+class Measurement:
+    op: str
+    widgets: int
+    image_mb: float
+    file_bytes: int
+    wall_s: float
+    peak_rss_kb: int
+    heap_peak_kb: int | None
+    bytes_read: int
+    bytes_written: int
+    bytes_copied: int
+
+
+def measure(op: str, template: str, widgets: int, image_mb: float, trace_heap: bool = False) -> Measurement:
+    """Run one operation on a fresh copy of `template`. Meant for a spawned worker."""
+    work = template + f".{op}.html"
+    shutil.copyfile(template, work)
+    shutil.rmtree(os.path.join(os.path.dirname(work), INDEX_DIR), ignore_errors=True)
+    patches = bench_patches(widgets)
+
+    counters_before = dict(COUNTERS)
+    rss_before = reset_peak_rss()
+    if trace_heap:
+        tracemalloc.start()
+    start = time.perf_counter()
+
+    if op == "index":
+        load_index(work)
+    elif op == "patch":
+        result = patch_file(work, patches)
+    elif op == "patch-mmap":
+        result = patch_file(work, patches, use_mmap=True)
+    else:
+        raise ValueError(f"Unknown op {op}")
+
+    wall = time.perf_counter() - start
+    heap_peak = None
+    if trace_heap:
+        heap_peak = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    rss_after = peak_rss()
+    moved = {k: COUNTERS[k] - counters_before[k] for k in COUNTERS}
+    if op != "index" and (result.error or not result.written):
+        raise RuntimeError(f"{op} did not patch {work}: {result.error or 'no change'}")
+
+    size = os.path.getsize(template)
+    os.unlink(work)
+    return Measurement(
+        op, widgets, image_mb, size, wall, max(0, rss_after - rss_before), heap_peak,
+        moved["bytes_read"], moved["bytes_written"], moved["bytes_copied"],
+    )
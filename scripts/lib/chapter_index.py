@@ -0,0 +1,231 @@
+"""
+Byte-offset index of the widgets in a generated chapter.
+
+Chapters follow the layout in src/prompts/chapter.ts: `.widget-container`
+divs in the body, then one `<!-- Widget N: Title -->` comment and inline
+`<script>` IIFE per widget before `</body>`. build_index() parses a chapter
+once and records, for each widget, the offsets of its container div, its
+comment and its script block. The script is matched to the widget by the ids
+declared inside the container, so reordered widgets still pair correctly.
+
+Indexes are cached in a sidecar file, `chapters/.widget-index/<name>.json`,
+keyed by the chapter's SHA-256. Sidecars for published copies
+(`publish/chapters/`) go to the course's `.widget-index/publish/` instead, so
+nothing is added to the package that gets deployed. Patch, audit and extract tools call
+load_index() and seek straight to the spans they need.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import shutil
+from dataclasses import asdict, dataclass, field
+
+INDEX_DIR = ".widget-index"
+INDEX_VERSION = 1
+
+# Chapters are handled as bytes: inline base64 images make them multi-megabyte,
+# and nothing outside the indexed spans ever needs decoding.
+TOKEN_RE = re.compile(
+    rb"<!--(.*?)-->"
+    rb"|<script\b([^>]*)>(.*?)</script\s*>"
+    rb"|<div\b([^>]*)>"
+    rb"|</div\s*>",
+    re.IGNORECASE | re.DOTALL,
+)
+ID_ATTR_RE = re.compile(rb"""\bid\s*=\s*["']([^"']+)["']""")
+CLASS_ATTR_RE = re.compile(rb"""\bclass\s*=\s*["']([^"']*)["']""")
+WIDGET_COMMENT_RE = re.compile(rb"^\s*Widget\s+(\d+)\s*:\s*(.*?)\s*$", re.DOTALL)
+
+Span = tuple[int, int]
+
+
+@dataclass
+class WidgetEntry:
+    widget_id: str
+    container: Span
+    ids: list[str]
+    number: int | None = None
+    title: str | None = None
+    comment: Span | None = None
+    script: Span | None = None
+    body: Span | None = None
+
+
+@dataclass
+class ChapterIndex:
+    sha256: str
+    size: int
+    mtime_ns: int
+    widgets: list[WidgetEntry] = field(default_factory=list)
+
+    def get(self, widget_id: str) -> WidgetEntry | None:
+        for widget in self.widgets:
+            if widget.widget_id == widget_id:
+                return widget
+        return None
+
+
+# ── Building ────────────────────────────────────────────────────────────────
+
+@dataclass
+class _Script:
+    script: Span
+    body: Span
+    comment: Span | None
+    number: int | None
+    title: str | None
+
+
+def build_index(data: bytes) -> list[WidgetEntry]:
+    """Parse `data` once and return its widgets in document order.
+
+    Script and comment bodies are consumed whole, so `<div` strings inside
+    widget JS never disturb the nesting count.
+    """
+    widgets: list[WidgetEntry] = []
+    scripts: list[_Script] = []
+    stack: list[tuple[int, str | None]] = []
+    last_comment = None
+
+    for m in TOKEN_RE.finditer(data):
+        if m.group(1) is not None:
+            last_comment = m
+        elif m.group(3) is not None:
+            if b"src=" in m.group(2):
+                continue
+            comment = number = title = None
+            if last_comment and not data[last_comment.end():m.start()].strip():
+                wm = WIDGET_COMMENT_RE.match(last_comment.group(1))
+                if wm:
+                    comment = last_comment.span()
+                    number = int(wm.group(1))
+                    title = wm.group(2).decode("utf-8", "replace")
+            scripts.append(_Script(m.span(), m.span(3), comment, number, title))
+        elif m.group(4) is not None:
+            attrs = m.group(4)
+            cls = CLASS_ATTR_RE.search(attrs)
+            wid = ID_ATTR_RE.search(attrs)
+            is_widget = cls and b"widget-container" in cls.group(1).split() and wid
+            stack.append((m.start(), wid.group(1).decode() if is_widget else None))
+        elif stack:
+            start, widget_id = stack.pop()
+            if widget_id is not None and all(w.widget_id != widget_id for w in widgets):
+                ids = [i.decode() for i in ID_ATTR_RE.findall(data, start, m.end())]
+                widgets.append(WidgetEntry(widget_id, (start, m.end()), ids))
+
+    claimed: set[int] = set()
+    for widget in widgets:
+        needles = [q + i.encode() + q for i in widget.ids for q in (b"'", b'"')]
+        for n, script in enumerate(scripts):
+            if n in claimed or script.body[0] < widget.container[1]:
+                continue
+            body = data[script.body[0]:script.body[1]]
+            if any(needle in body for needle in needles):
+                claimed.add(n)
+                widget.script, widget.body = script.script, script.body
+                widget.comment, widget.number, widget.title = script.comment, script.number, script.title
+                break
+
+    return widgets
+
+
+# ── Sidecar cache ───────────────────────────────────────────────────────────
+
+def _published_course(chapter_path: str) -> str | None:
+    """The course directory if `chapter_path` is in `<course>/publish/chapters/`."""
+    chapters_dir = os.path.dirname(os.path.abspath(chapter_path))
+    publish_dir = os.path.dirname(chapters_dir)
+    if os.path.basename(chapters_dir) == "chapters" and os.path.basename(publish_dir) == "publish":
+        return os.path.dirname(publish_dir)
+    return None
+
+
+def index_path(chapter_path: str) -> str:
+    head, name = os.path.split(chapter_path)
+    course = _published_course(chapter_path)
+    if course:
+        return os.path.join(course, INDEX_DIR, "publish", name + ".json")
+    return os.path.join(head, INDEX_DIR, name + ".json")
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _read_sidecar(path: str) -> ChapterIndex | None:
+    try:
+        with open(index_path(path), "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if raw.get("version") != INDEX_VERSION:
+        return None
+    widgets = []
+    for w in raw["widgets"]:
+        for key in ("container", "comment", "script", "body"):
+            if w[key] is not None:
+                w[key] = tuple(w[key])
+        widgets.append(WidgetEntry(**w))
+    return ChapterIndex(raw["sha256"], raw["size"], raw["mtime_ns"], widgets)
+
+
+def save_index(path: str, index: ChapterIndex) -> None:
+    sidecar = index_path(path)
+    os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+    if _published_course(path):
+        # Sidecars written into publish/ by earlier versions would be deployed.
+        shutil.rmtree(os.path.join(os.path.dirname(path), INDEX_DIR), ignore_errors=True)
+    tmp = sidecar + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": INDEX_VERSION, **asdict(index)}, f)
+    os.replace(tmp, sidecar)
+
+
+def load_index(path: str, data: bytes | None = None) -> ChapterIndex:
+    """Return the index for `path`, rebuilding and saving it if stale.
+
+    When `data` is not supplied, a sidecar whose size and mtime still match the
+    file is trusted without reading the chapter at all; otherwise the chapter
+    is memory-mapped rather than read. In both cases the chapter's hash decides.
+    """
+    st = os.stat(path)
+    cached = _read_sidecar(path)
+    if data is None:
+        if cached and cached.size == st.st_size and cached.mtime_ns == st.st_mtime_ns:
+            return cached
+        if st.st_size == 0:
+            return _refresh(path, b"", st, cached)
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return _refresh(path, mapped, st, cached)
+    return _refresh(path, data, st, cached)
+
+
+def _refresh(path: str, data: bytes, st: os.stat_result, cached: ChapterIndex | None) -> ChapterIndex:
+    digest = sha256_bytes(data)
+    if cached and cached.sha256 == digest:
+        if cached.mtime_ns != st.st_mtime_ns:
+            cached.mtime_ns = st.st_mtime_ns
+            save_index(path, cached)
+        return cached
+
+    index = ChapterIndex(digest, len(data), st.st_mtime_ns, build_index(data))
+    save_index(path, index)
+    return index
+
+
+def read_widget(path: str, widget_id: str) -> tuple[bytes, bytes | None] | None:
+    """Read one widget's container HTML and script body without loading the chapter."""
+    widget = load_index(path).get(widget_id)
+    if widget is None:
+        return None
+    with open(path, "rb") as f:
+        f.seek(widget.container[0])
+        container = f.read(widget.container[1] - widget.container[0])
+        body = None
+        if widget.body:
+            f.seek(widget.body[0])
+            body = f.read(widget.body[1] - widget.body[0])
+    return container, body
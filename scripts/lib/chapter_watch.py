@@ -0,0 +1,301 @@
+"""
+Watch output roots and re-apply widget patch specs as chapters are rewritten.
+
+generate-course.ts rewrites `chapters/<prefix>_<slug>.html` wholesale, which
+silently drops any fix applied earlier with patch-widgets.py. ChapterWatcher
+keeps the loaded specs, their widget ids and the course patch manifests in
+memory, and for every chapter that settles after a write (no further change
+for `debounce` seconds) applies only the specs whose widget ids occur in it,
+judged from the chapter's cached widget index rather than by reading it.
+
+File events come from Linux inotify through ctypes when available, otherwise
+from a stat-polling scan of `chapters/*.html`. Both report changed chapter
+paths only; hidden directories (the index sidecars, transaction staging) and
+temporary files are ignored. A chapter the watcher itself just rewrote is
+recognised by its size/mtime and not patched again.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+from dataclasses import dataclass, field, replace
+
+from chapter_index import load_index
+from patch_manifest import Manifest, course_root, spec_hash
+from widget_patch import FileResult, WidgetPatch, find_chapters, load_spec, patch_file
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0x800
+IN_CLOEXEC = 0x80000
+
+EVENT_HEADER = struct.Struct("iIII")
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+
+
+def _is_chapter(path: str) -> bool:
+    return path.endswith(".html") and os.path.basename(os.path.dirname(path)) == "chapters"
+
+
+def _walk_dirs(root: str):
+    for dirpath, dirnames, _ in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".") and d != "node_modules"]
+        yield dirpath
+
+
+# ── Event sources ───────────────────────────────────────────────────────────
+
+class PollingSource:
+    """Report chapters whose (size, mtime) changed since the previous scan."""
+
+    name = "polling"
+
+    def __init__(self, roots: list[str], interval: float = 1.0):
+        self.roots = roots
+        self.interval = interval
+        self.seen = self._scan()
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        stats = {}
+        for path in find_chapters(self.roots):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stats[path] = (st.st_size, st.st_mtime_ns)
+        return stats
+
+    def wait(self, timeout: float) -> list[str]:
+        time.sleep(min(timeout, self.interval))
+        current = self._scan()
+        changed = [p for p, st in current.items() if self.seen.get(p) != st]
+        self.seen = current
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class InotifySource:
+    """Report chapters written or renamed into place, via inotify (Linux only)."""
+
+    name = "inotify"
+
+    def __init__(self, roots: list[str]):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs: dict[int, str] = {}
+        for root in roots:
+            for d in _walk_dirs(root):
+                self._watch(d)
+
+    def _watch(self, path: str) -> None:
+        wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                raise OSError(err, "inotify watch limit reached (raise fs.inotify.max_user_watches)")
+            return  # Directory vanished before it could be watched.
+        self.dirs[wd] = path
+
+    def wait(self, timeout: float) -> list[str]:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        changed = []
+        pos = 0
+        while pos < len(buf):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(buf, pos)
+            pos += EVENT_HEADER.size
+            name = buf[pos:pos + length].rstrip(b"\0").decode("utf-8", "surrogateescape")
+            pos += length
+            parent = self.dirs.get(wd)
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+            if parent is None or not name:
+                continue
+            path = os.path.join(parent, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not name.startswith(".") and name != "node_modules":
+                    # New directories (a fresh course, its chapters/) are watched
+                    # too, and any chapters already inside them are reported.
+                    for d in _walk_dirs(path):
+                        self._watch(d)
+                    changed += find_chapters([path])
+            elif _is_chapter(path):
+                changed.append(path)
+        return changed
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def open_source(roots: list[str], poll: bool = False, interval: float = 1.0):
+    """inotify where it works, else polling."""
+    if not poll:
+        try:
+            return InotifySource(roots)
+        except (OSError, AttributeError):
+            pass
+    return PollingSource(roots, interval)
+
+
+# ── Watcher ─────────────────────────────────────────────────────────────────
+
+@dataclass
+class Spec:
+    path: str
+    patches: list[WidgetPatch]
+    hash: str
+    widget_ids: set[str]
+    mtime_ns: int
+
+
+@dataclass
+class WatchEvent:
+    path: str
+    results: list[tuple[str, FileResult]] = field(default_factory=list)
+    elapsed: float = 0.0
+    error: str | None = None
+
+
+class ChapterWatcher:
+    def __init__(self, spec_paths: list[str], roots: list[str], debounce: float = 0.3, use_mmap: bool = False):
+        self.roots = roots
+        self.debounce = debounce
+        self.use_mmap = use_mmap
+        self.specs = [self._load(p) for p in spec_paths]
+        self.manifests: dict[str, Manifest] = {}
+        self.pending: dict[str, float] = {}
+        self.own_writes: dict[str, tuple[int, int]] = {}
+
+    def _load(self, path: str) -> Spec:
+        patches = load_spec(path)
+        return Spec(path, patches, spec_hash(patches), {p.widget_id for p in patches}, os.stat(path).st_mtime_ns)
+
+    def _manifest(self, path: str) -> Manifest:
+        root = course_root(path)
+        return self.manifests.get(root) or self.manifests.setdefault(root, Manifest(root))
+
+    def reload_specs(self) -> tuple[list[Spec], list[tuple[str, str]]]:
+        """Reload spec files edited since they were loaded.
+
+        Returns (reloaded specs, [(path, error)] for edits that did not load).
+        A spec that fails to load keeps its previous patches, and is retried
+        once the file is edited again. A .py spec is executed, so a half-edited
+        one can raise anything (NameError, ImportError, ...); all of it is caught.
+        """
+        reloaded, failed = [], []
+        for i, spec in enumerate(self.specs):
+            try:
+                mtime_ns = os.stat(spec.path).st_mtime_ns
+            except OSError:
+                continue  # Mid-save; pick it up on the next pass.
+            if mtime_ns == spec.mtime_ns:
+                continue
+            try:
+                self.specs[i] = self._load(spec.path)
+                reloaded.append(self.specs[i])
+            except Exception as e:
+                self.specs[i] = replace(spec, mtime_ns=mtime_ns)
+                failed.append((spec.path, f"{type(e).__name__}: {e}"))
+        return reloaded, failed
+
+    def notice(self, paths: list[str]) -> None:
+        """Record file events; each path is handled once it has been quiet for `debounce`."""
+        now = time.monotonic()
+        for path in paths:
+            self.pending[path] = now
+
+    def due(self) -> list[str]:
+        cutoff = time.monotonic() - self.debounce
+        ready = [p for p, t in self.pending.items() if t <= cutoff]
+        for p in ready:
+            del self.pending[p]
+        return sorted(ready)
+
+    def matching_specs(self, path: str) -> list[Spec]:
+        """Specs with at least one widget in the chapter, going by its widget index.
+
+        The index sidecar is reused while the chapter's size/mtime match, and
+        rebuilt from an mmap otherwise, so the chapter is never read whole here.
+        """
+        present = {w.widget_id for w in load_index(path).widgets}
+        return [s for s in self.specs if not s.widget_ids.isdisjoint(present)]
+
+    def apply(self, path: str, specs: list[Spec] | None = None) -> WatchEvent:
+        """Re-apply `specs` (default: those targeting the chapter) to one chapter.
+
+        Without `specs` this is a file event, and a chapter the watcher wrote
+        itself is left alone; explicit specs (a reloaded spec) always apply.
+        """
+        event = WatchEvent(path)
+        start = time.perf_counter()
+        try:
+            if specs is None:
+                st = os.stat(path)
+                if self.own_writes.get(path) == (st.st_size, st.st_mtime_ns):
+                    return event
+                specs = self.matching_specs(path)
+        except OSError:
+            return event  # Deleted or renamed away before it settled.
+        except Exception as e:
+            event.error = f"{type(e).__name__}: {e}"
+            return event
+
+        manifest = self._manifest(path)
+        for spec in specs:
+            entry = manifest.get(path, spec.hash)
+            try:
+                result = patch_file(path, spec.patches, use_mmap=self.use_mmap,
+                                    expected_sha256=entry["output"] if entry else None)
+            except Exception as e:
+                # patch_file reports OSError/PatchError itself; anything else is
+                # a bug in a spec or chapter, and must not end the watcher.
+                result = FileResult(path, error=f"{type(e).__name__}: {e}")
+            event.results.append((spec.path, result))
+            if result.output_sha256 and not result.error:
+                applied = entry.get("applied", []) if result.skipped and entry else result.applied
+                manifest.record(path, spec.hash, result.input_sha256, result.output_sha256, applied)
+        try:
+            manifest.save()
+            if any(r.written for _, r in event.results):
+                st = os.stat(path)
+                self.own_writes[path] = (st.st_size, st.st_mtime_ns)
+        except OSError as e:
+            event.error = str(e)
+        event.elapsed = time.perf_counter() - start
+        return event
+
+    def catch_up(self, specs: list[Spec] | None = None) -> list[WatchEvent]:
+        """Apply specs to every chapter under the roots (start-up and spec reloads)."""
+        events = []
+        for path in find_chapters(self.roots):
+            try:
+                targeted = [s for s in self.matching_specs(path) if specs is None or s in specs]
+            except OSError:
+                continue  # Removed since the scan; its own event will follow if it returns.
+            except Exception as e:
+                events.append(WatchEvent(path, error=f"{type(e).__name__}: {e}"))
+                continue
+            if targeted:
+                events.append(self.apply(path, targeted))
+        return events
@@ -0,0 +1,131 @@
+"""
+Move inline base64 images out of published chapters into a content-addressed
+asset store.
+
+node-image-placer.ts embeds each Gemini image as `<img src="data:...;base64,...">`
+and publish.ts copies those chapters into `publish/chapters/` unchanged. This
+stage streams through each published chapter, decodes every data URI once
+(in bounded chunks), stores it as `publish/img/<sha256>.<ext>` and rewrites the
+`src` to that path. Identical images across chapters share one file, so the
+browser fetches and caches each image once.
+"""
+
+import binascii
+import hashlib
+import mimetypes
+import mmap
+import os
+import re
+from dataclasses import dataclass, field
+
+from pipeline_trace import file_scope, span
+from widget_patch import COUNTERS, Edit, replace_spliced
+
+DATA_IMG_RE = re.compile(
+    rb"""<img\b[^>]*?\bsrc\s*=\s*(["'])data:(image/[\w.+-]+);base64,""",
+    re.IGNORECASE,
+)
+
+EXTENSIONS = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/jpg": ".jpg",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+    "image/svg+xml": ".svg",
+    "image/avif": ".avif",
+}
+
+# Base64 is decoded in chunks of this many characters (a multiple of 4), so a
+# 15 MB image never has to sit in memory whole.
+CHUNK = 1 << 20
+
+
+@dataclass
+class ImageResult:
+    path: str
+    images: int = 0
+    assets: list[str] = field(default_factory=list)
+    bytes_before: int = 0
+    bytes_after: int = 0
+    error: str | None = None
+
+
+def extension_for(mime: str) -> str:
+    return EXTENSIONS.get(mime.lower()) or mimetypes.guess_extension(mime) or ".bin"
+
+
+def _decode(view: memoryview, start: int, end: int, out=None) -> str:
+    """Decode view[start:end] chunk by chunk, writing to `out` if given. Returns the sha256."""
+    digest = hashlib.sha256()
+    for pos in range(start, end, CHUNK):
+        decoded = binascii.a2b_base64(view[pos:min(pos + CHUNK, end)])
+        digest.update(decoded)
+        if out:
+            out.write(decoded)
+    return digest.hexdigest()
+
+
+def image_name(view: memoryview, start: int, end: int, mime: str) -> str:
+    """The name store_image() would give view[start:end], without writing anything."""
+    return _decode(view, start, end) + extension_for(mime)
+
+
+def store_image(view: memoryview, start: int, end: int, mime: str, img_dir: str) -> str:
+    """Decode view[start:end] into img_dir/<sha256><ext>. Returns the file name."""
+    tmp = os.path.join(img_dir, f".incoming-{os.getpid()}")
+    try:
+        with open(tmp, "wb") as out:
+            sha256 = _decode(view, start, end, out)
+    except BaseException:
+        # A corrupt data URI must not leave a partial file in the published package.
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+    name = sha256 + extension_for(mime)
+    dest = os.path.join(img_dir, name)
+    if os.path.exists(dest):
+        os.unlink(tmp)
+    else:
+        os.replace(tmp, dest)
+    return name
+
+
+def extract_images(path: str, img_dir: str, dry_run: bool = False) -> ImageResult:
+    """Rewrite every inline data-URI image in the chapter at `path`."""
+    result = ImageResult(path)
+    with file_scope(path, COUNTERS):
+        try:
+            size = os.path.getsize(path)
+            result.bytes_before = result.bytes_after = size
+            if not size:
+                return result
+            prefix = os.path.relpath(img_dir, os.path.dirname(path)).replace(os.sep, "/")
+
+            with open(path, "rb") as src, mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                edits: list[Edit] = []
+                with span("extract"), memoryview(mapped) as view:
+                    for m in DATA_IMG_RE.finditer(mapped):
+                        data_start = m.start(2) - len(b"data:")
+                        data_end = mapped.find(m.group(1), m.end())
+                        if data_end < 0:
+                            raise ValueError(f"Unterminated data URI at byte {data_start}")
+                        mime = m.group(2).decode()
+                        if dry_run:
+                            name = image_name(view, m.end(), data_end, mime)
+                        else:
+                            name = store_image(view, m.end(), data_end, mime, img_dir)
+                        edits.append((data_start, data_end, f"{prefix}/{name}".encode()))
+                        result.assets.append(name)
+
+                result.images = len(edits)
+                result.bytes_after = size + sum(len(r) - (e - s) for s, e, r in edits)
+                if edits and not dry_run:
+                    with span("write"):
+                        replace_spliced(path, mapped, edits, src.fileno())
+        except (OSError, ValueError, binascii.Error) as e:
+            result.error = str(e)
+    return result
@@ -0,0 +1,261 @@
+"""
+Minimal pure-Python JavaScript tokenizer, enough to syntax-check widget IIFEs
+without Node.
+
+It understands comments, string and template literals (including nested
+`${...}` expressions), regex literals (told apart from division by the
+previous token) and bracket nesting. It is not a full parser: it catches the
+failures generated widgets actually have — truncated output, unterminated
+strings and unbalanced brackets — not every grammar error.
+
+Run this file directly to check the tokenizer against SELF_CHECKS.
+"""
+
+from dataclasses import dataclass
+
+KEYWORDS_BEFORE_EXPRESSION = {
+    "return", "typeof", "case", "do", "else", "in", "of", "new", "delete",
+    "void", "throw", "instanceof", "yield", "await",
+}
+# A `)` closing the head of one of these is followed by a statement, so a `/`
+# after it starts a regex (`if (x) /re/.test(s)`); after any other `)` it divides.
+CONTROL_HEADS = {"if", "while", "for", "with"}
+# Single-character punctuators after which `/` starts a regex. `++` and `--`
+# are tokenized whole and are not listed: `i++ / n` is a division.
+PUNCT_BEFORE_EXPRESSION = set("(,=:[!&|?{};+-*%<>~^")
+OPENERS = {"(": ")", "[": "]", "{": "}"}
+CLOSERS = {v: k for k, v in OPENERS.items()}
+
+
+class JsSyntaxError(Exception):
+    def __init__(self, message: str, line: int):
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+
+
+@dataclass
+class Token:
+    kind: str  # "ident", "number", "string", "template", "regex", "punct"
+    value: str
+    line: int
+
+
+def _is_ident(ch: str) -> bool:
+    return ch.isalnum() or ch in "_$" or ord(ch) > 127
+
+
+def tokenize(src: str):
+    """Yield Tokens for `src`, raising JsSyntaxError on malformed input."""
+    i, n, line = 0, len(src), 1
+    prev: Token | None = None
+    # Bracket stack; "${" entries mark template-literal expressions.
+    stack: list[tuple[str, int]] = []
+    # One entry per open "(": whether it opened a control-statement head.
+    paren_heads: list[bool] = []
+    head_close: Token | None = None
+
+    def scan_template(i: int, line: int) -> tuple[int, int, bool]:
+        """Scan template text from i. Returns (index, line, entered_expression)."""
+        while i < n:
+            ch = src[i]
+            if ch == "\\":
+                i += 2
+                continue
+            if ch == "\n":
+                line += 1
+            if ch == "`":
+                return i + 1, line, False
+            if ch == "$" and src.startswith("${", i):
+                return i + 2, line, True
+            i += 1
+        raise JsSyntaxError("unterminated template literal", line)
+
+    while i < n:
+        ch = src[i]
+        start_line = line
+
+        if ch == "\n":
+            line += 1
+            i += 1
+            continue
+        if ch.isspace():
+            i += 1
+            continue
+
+        if src.startswith("//", i):
+            end = src.find("\n", i)
+            i = n if end < 0 else end
+            continue
+        if src.startswith("/*", i):
+            end = src.find("*/", i + 2)
+            if end < 0:
+                raise JsSyntaxError("unterminated comment", line)
+            line += src.count("\n", i, end)
+            i = end + 2
+            continue
+
+        if ch in "'\"":
+            j = i + 1
+            while j < n and src[j] != ch:
+                if src[j] == "\\":
+                    if src.startswith("\r\n", j + 1):
+                        j += 1
+                    line += src[j + 1:j + 2] == "\n"
+                    j += 2
+                    continue
+                if src[j] == "\n":
+                    raise JsSyntaxError("unterminated string literal", start_line)
+                j += 1
+            if j >= n:
+                raise JsSyntaxError("unterminated string literal", start_line)
+            prev = Token("string", src[i:j + 1], start_line)
+            yield prev
+            i = j + 1
+            continue
+
+        if ch == "`":
+            j, line, entered = scan_template(i + 1, line)
+            if entered:
+                stack.append(("${", start_line))
+            prev = Token("template", src[i:j], start_line)
+            yield prev
+            i = j
+            continue
+
+        if ch == "/" and (
+            prev is None
+            or (prev.kind == "punct" and prev.value in PUNCT_BEFORE_EXPRESSION)
+            or (prev.kind == "ident" and prev.value in KEYWORDS_BEFORE_EXPRESSION)
+            or prev is head_close
+        ):
+            j, in_class = i + 1, False
+            while j < n:
+                c = src[j]
+                if c == "\n":
+                    raise JsSyntaxError("unterminated regex literal", start_line)
+                if c == "\\":
+                    j += 2
+                    continue
+                if c == "[":
+                    in_class = True
+                elif c == "]":
+                    in_class = False
+                elif c == "/" and not in_class:
+                    break
+                j += 1
+            else:
+                raise JsSyntaxError("unterminated regex literal", start_line)
+            j += 1
+            while j < n and _is_ident(src[j]):
+                j += 1
+            prev = Token("regex", src[i:j], start_line)
+            yield prev
+            i = j
+            continue
+
+        if _is_ident(ch):
+            j = i + 1
+            if ch.isdigit():
+                while j < n and (_is_ident(src[j]) or src[j] == "." or
+                                 (src[j] in "+-" and src[j - 1] in "eE" and not src[i:j].startswith("0x"))):
+                    j += 1
+                kind = "number"
+            else:
+                while j < n and _is_ident(src[j]):
+                    j += 1
+                kind = "ident"
+            prev = Token(kind, src[i:j], start_line)
+            yield prev
+            i = j
+            continue
+
+        closes_head = False
+        if ch in OPENERS:
+            stack.append((ch, line))
+            if ch == "(":
+                paren_heads.append(prev is not None and prev.kind == "ident" and prev.value in CONTROL_HEADS)
+        elif ch in CLOSERS:
+            if not stack:
+                raise JsSyntaxError(f"unexpected '{ch}'", line)
+            opener, opened = stack.pop()
+            if opener == "${" and ch == "}":
+                j, line, entered = scan_template(i + 1, line)
+                if entered:
+                    stack.append(("${", start_line))
+                prev = Token("template", src[i:j], start_line)
+                yield prev
+                i = j
+                continue
+            if opener != CLOSERS[ch]:
+                raise JsSyntaxError(f"'{ch}' does not match '{opener}' opened on line {opened}", line)
+            if ch == ")":
+                closes_head = paren_heads.pop()
+        elif ch == "." and i + 1 < n and src[i + 1].isdigit():
+            j = i + 1
+            while j < n and _is_ident(src[j]):
+                j += 1
+            prev = Token("number", src[i:j], line)
+            yield prev
+            i = j
+            continue
+
+        if ch in "+-" and src.startswith(ch * 2, i):
+            prev = Token("punct", ch * 2, line)
+            yield prev
+            i += 2
+            continue
+
+        prev = Token("punct", ch, line)
+        if closes_head:
+            head_close = prev
+        yield prev
+        i += 1
+
+    if stack:
+        opener, opened = stack[-1]
+        raise JsSyntaxError(f"'{opener}' opened on line {opened} is never closed", line)
+
+
+def check_syntax(src: str) -> tuple[list[Token], JsSyntaxError | None]:
+    """Tokenize `src` fully. Returns (tokens so far, error or None)."""
+    tokens: list[Token] = []
+    try:
+        for token in tokenize(src):
+            tokens.append(token)
+    except JsSyntaxError as e:
+        return tokens, e
+    return tokens, None
+
+
+# (source, expected error substring or None). Run this module to check them.
+SELF_CHECKS = [
+    ("var pct = done++ / total;", None),
+    ("var half = b-- / 2;", None),
+    ("var r = /a+b/g.test(s); x = a / b / c;", None),
+    ("if (x) /re/.exec(s); return /[/]/;", None),
+    ("var t = `a ${b ? `c${d}` : '}'} e`;", None),
+    ("var s = 'it\\'s'; i++; --j;", None),
+    ("var x = ++i / 2;", None),
+    ("if (x) /[\"]/.test(s); while (f(a)) /'/g.exec(s);", None),
+    ("var r = (a + b) / 2 / (c) / d;", None),
+    ("var s = 'open;", "unterminated string literal"),
+    ("var t = `abc ${x}", "unterminated template literal"),
+    ("var r = x = /abc;", "unterminated regex literal"),
+    ("(function() { if (a) { b(); }", "never closed"),
+    ("f(a]);", "does not match"),
+    ("/* open", "unterminated comment"),
+]
+
+
+if __name__ == "__main__":
+    import sys
+
+    failures = 0
+    for source, expected in SELF_CHECKS:
+        _, err = check_syntax(source)
+        ok = err is None if expected is None else err is not None and expected in str(err)
+        if not ok:
+            failures += 1
+            print(f"FAIL {source!r}: expected {expected or 'no error'}, got {err or 'no error'}")
+    print(f"{len(SELF_CHECKS) - failures}/{len(SELF_CHECKS)} tokenizer checks passed")
+    sys.exit(1 if failures else 0)
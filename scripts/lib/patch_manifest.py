@@ -0,0 +1,77 @@
+"""
+Incremental rebuild manifest for the chapter patch tools.
+
+Each course keeps `patch-manifest.json` next to its `course.json`, recording
+for every (chapter, patch spec) pair the chapter's content hash going in, the
+hash coming out, the widget ids the spec applied to, and the size/mtime the
+output had when it was written. A
+re-run skips any chapter whose size and mtime still match, and a worker that
+finds the chapter's hash equal to the recorded output skips it as well, so
+re-running a spec across a whole library touches nothing that is already done.
+"""
+
+import hashlib
+import json
+import os
+
+from build_state import JsonManifest
+
+MANIFEST_NAME = "patch-manifest.json"
+MANIFEST_VERSION = 1
+
+
+def course_root(chapter_path: str) -> str:
+    """The course output directory a chapter belongs to.
+
+    That is the nearest ancestor holding `course.json` (so published copies in
+    `publish/chapters/` share their course's manifest), or else the parent of
+    the chapter's `chapters/` directory.
+    """
+    chapters_dir = os.path.dirname(os.path.abspath(chapter_path))
+    parent = os.path.dirname(chapters_dir)
+    for candidate in (parent, os.path.dirname(parent)):
+        if os.path.exists(os.path.join(candidate, "course.json")):
+            return candidate
+    if os.path.basename(parent) == "publish":
+        return os.path.dirname(parent)  # Never write state into the deployed package.
+    return parent
+
+
+def spec_hash(patches) -> str:
+    """Stable hash of a patch spec (a list of WidgetPatch)."""
+    canonical = json.dumps(
+        [[p.widget_id, p.container_html, p.script_js, p.expect, p.path_glob] for p in patches],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class Manifest(JsonManifest):
+    VERSION = MANIFEST_VERSION
+    SECTION = "chapters"
+
+    def __init__(self, root: str):
+        self.root = root
+        super().__init__(os.path.join(root, MANIFEST_NAME))
+
+    def key(self, chapter_path: str) -> str:
+        return os.path.relpath(os.path.abspath(chapter_path), self.root).replace(os.sep, "/")
+
+    def get(self, chapter_path: str, spec: str) -> dict | None:
+        return self.entries.get(self.key(chapter_path), {}).get(spec)
+
+    def is_current(self, chapter_path: str, spec: str, st: os.stat_result) -> bool:
+        entry = self.get(chapter_path, spec)
+        return bool(entry) and (entry["size"], entry["mtime_ns"]) == (st.st_size, st.st_mtime_ns)
+
+    def record(self, chapter_path: str, spec: str, input_sha256: str, output_sha256: str,
+               applied: list[str]) -> None:
+        st = os.stat(chapter_path)
+        self.entries.setdefault(self.key(chapter_path), {})[spec] = {
+            "input": input_sha256,
+            "output": output_sha256,
+            "applied": applied,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+        }
+        self.dirty = True
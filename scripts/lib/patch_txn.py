@@ -0,0 +1,205 @@
+"""
+All-or-nothing commit for multi-file patch runs.
+
+Workers never touch a target. Each writes its output, fsynced, into a staging
+directory beside the target (`<dir>/.patch-txn-<id>/<name>`, so the final
+rename stays on one filesystem). Once every file has staged cleanly the
+transaction:
+
+  1. writes a journal listing every (target, staged, backup) and fsyncs it
+  2. hard-links each target to its backup, then renames the staged file over it
+  3. fsyncs the target directories and marks the journal committed
+  4. removes backups, staging directories and the journal
+
+Any failure during step 2 restores every target from its backup. A run that
+was killed mid-commit leaves its journal in `<root>/.patch-txn/`, and
+recover() rolls it back the next time a patch run starts on that root. The
+journal lists every root the batch covers, so a run killed while still
+staging has its staging directories removed under all of them, not just the
+root holding the journal.
+
+A transaction holds an exclusive flock on `<root>/.patch-txn/lock` from the
+moment it is created until it finishes, so a second batch on the same root
+waits for it, and recover() (which needs the same lock) leaves a live run's
+journal and staging directories alone. The kernel drops the lock when its
+holder dies, which is what makes a leftover journal safe to act on.
+"""
+
+import json
+import os
+import shutil
+import time
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows: runs there are not serialized.
+    fcntl = None
+
+TXN_DIR = ".patch-txn"
+LOCK_NAME = "lock"
+
+
+class TransactionError(Exception):
+    pass
+
+
+def stage_dir(target: str, txn_id: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(target)), f"{TXN_DIR}-{txn_id}")
+
+
+def stage_path(target: str, txn_id: str) -> str:
+    return os.path.join(stage_dir(target, txn_id), os.path.basename(target))
+
+
+def fsync_dir(path: str) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass  # Not supported for directories on every platform.
+    finally:
+        os.close(fd)
+
+
+def lock_root(txn_dir: str, blocking: bool = True) -> int | None:
+    """Take the exclusive lock for `txn_dir`. Returns its fd, or None if busy and not blocking."""
+    os.makedirs(txn_dir, exist_ok=True)
+    fd = os.open(os.path.join(txn_dir, LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o644)
+    if fcntl:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            os.close(fd)
+            return None
+    return fd
+
+
+def _write_json(path: str, payload: dict) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    fsync_dir(os.path.dirname(path))
+
+
+class Transaction:
+    def __init__(self, root: str, roots: list[str] | None = None):
+        """Journal and lock under `root`; `roots` are every tree the batch stages into (default: root)."""
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{os.urandom(2).hex()}"
+        self.dir = os.path.join(os.path.abspath(root), TXN_DIR)
+        self.journal = os.path.join(self.dir, f"{self.id}.json")
+        self.roots = sorted({os.path.abspath(r) for r in roots or [root]})
+        self.entries: list[dict] = []
+        self.lock = lock_root(self.dir)
+        self._write("staging")
+
+    def _write(self, state: str) -> None:
+        _write_json(self.journal, {"id": self.id, "state": state, "roots": self.roots, "entries": self.entries})
+
+    def add(self, target: str, staged: str, expected_stat: tuple[int, int]) -> None:
+        target = os.path.abspath(target)
+        self.entries.append({
+            "target": target,
+            "staged": staged,
+            "backup": staged + ".orig",
+            "size": expected_stat[0],
+            "mtime_ns": expected_stat[1],
+        })
+
+    def commit(self) -> None:
+        self._write("committing")
+        try:
+            for entry in self.entries:
+                st = os.stat(entry["target"])
+                if (st.st_size, st.st_mtime_ns) != (entry["size"], entry["mtime_ns"]):
+                    raise TransactionError(f"{entry['target']} changed after it was staged")
+                try:
+                    os.link(entry["target"], entry["backup"])
+                except OSError:
+                    shutil.copy2(entry["target"], entry["backup"])
+                os.replace(entry["staged"], entry["target"])
+            for d in {os.path.dirname(e["target"]) for e in self.entries}:
+                fsync_dir(d)
+        except BaseException:
+            _rollback(self.entries)
+            self._close("rolled-back")
+            raise
+        self._close("committed")
+
+    def abort(self) -> None:
+        self._close("aborted")
+
+    def _close(self, state: str) -> None:
+        try:
+            _finish(self.journal, self.id, self.roots, self.entries, state)
+        finally:
+            os.close(self.lock)
+
+
+def _rollback(entries: list[dict]) -> None:
+    for entry in entries:
+        if os.path.exists(entry["backup"]):
+            os.replace(entry["backup"], entry["target"])
+    for d in {os.path.dirname(e["target"]) for e in entries}:
+        fsync_dir(d)
+
+
+def _finish(journal: str, txn_id: str, roots: list[str], entries: list[dict], state: str) -> None:
+    _write_json(journal, {"id": txn_id, "state": state, "roots": roots, "entries": entries})
+    for d in {os.path.dirname(e["staged"]) for e in entries}:
+        shutil.rmtree(d, ignore_errors=True)
+    os.unlink(journal)
+
+
+def recover(roots: list[str]) -> list[str]:
+    """Roll back any transaction left unfinished under `roots`. Returns messages.
+
+    A root whose lock is held belongs to a run still in progress and is skipped.
+    """
+    messages = []
+    for root in roots:
+        txn_dir = os.path.join(os.path.abspath(root), TXN_DIR)
+        if not os.path.isdir(txn_dir):
+            continue
+        lock = lock_root(txn_dir, blocking=False)
+        if lock is None:
+            messages.append(f"Skipped recovery under {root}: another patch run is in progress")
+            continue
+        try:
+            messages += _recover_locked(root, txn_dir)
+        finally:
+            os.close(lock)
+    return messages
+
+
+def _recover_locked(root: str, txn_dir: str) -> list[str]:
+    messages = []
+    for name in sorted(os.listdir(txn_dir)):
+        if not name.endswith(".json"):
+            continue
+        journal = os.path.join(txn_dir, name)
+        with open(journal, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        roots = raw.get("roots") or [os.path.abspath(root)]
+        if raw["state"] == "committing":
+            _rollback(raw["entries"])
+            messages.append(f"Rolled back interrupted transaction {raw['id']} ({len(raw['entries'])} file(s))")
+        elif raw["state"] == "staging":
+            _remove_staging_dirs(roots, raw["id"])
+            messages.append(f"Discarded staged files of interrupted transaction {raw['id']}")
+        _finish(journal, raw["id"], roots, raw["entries"], raw["state"])
+    return messages
+
+
+def _remove_staging_dirs(roots: list[str], txn_id: str) -> None:
+    name = f"{TXN_DIR}-{txn_id}"
+    for root in roots:
+        for dirpath, dirnames, _ in os.walk(root):
+            if name in dirnames:
+                shutil.rmtree(os.path.join(dirpath, name), ignore_errors=True)
+            dirnames[:] = [d for d in dirnames if not d.startswith(".") and d != "node_modules"]
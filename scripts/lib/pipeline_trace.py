@@ -0,0 +1,286 @@
+"""
+Per-file, per-stage timing trace for the chapter post-processing tools.
+
+Tracing is off unless CLASSBUILD_TRACE names a directory (the CLIs set it from
+`--trace DIR`: add_arguments() defines the flags, start() calls enable() and
+report() prints the summary). Because it is an environment variable, pool
+workers inherit it whether they are forked or spawned. Each process then
+appends to its own `events-<pid>.jsonl` in that directory:
+
+  {"type": "span", "name": "read", "file": ..., "ts_us": ..., "dur_us": ..., "pid": ..., "tid": ...}
+  {"type": "file", "file": ..., "ts_us": ..., "wall_ms": ..., "stages_ms": {...}, "bytes_read": ...,
+   "bytes_written": ..., "bytes_copied": ..., "peak_rss_kb": ..., "heap_peak_kb": ...}
+
+finish() (called by the CLI once the run is over) merges those into
+`trace.jsonl` and a Chrome `trace.json` (trace_event format, open it in
+chrome://tracing or Perfetto). Timestamps come from the monotonic clock,
+which all processes share, so worker lanes line up.
+
+With CLASSBUILD_TRACE_PROFILE=1 each process also runs cProfile around every
+traced file. Each process writes its stats once, as it exits (pool workers
+included, via multiprocessing's exit finalizers; the main process from
+finish()), and finish() merges them into `profile.prof`. With
+CLASSBUILD_TRACE_HEAP=1 tracemalloc reports each file's Python heap peak.
+Both distort timings, so leave them off when comparing wall times.
+
+When tracing is off, span() and file_scope() return a shared no-op context.
+"""
+
+import contextlib
+import cProfile
+import glob
+import json
+import multiprocessing.util
+import os
+import pstats
+import re
+import resource
+import threading
+import time
+import tracemalloc
+
+TRACE_ENV = "CLASSBUILD_TRACE"
+PROFILE_ENV = "CLASSBUILD_TRACE_PROFILE"
+HEAP_ENV = "CLASSBUILD_TRACE_HEAP"
+
+_NULL = contextlib.nullcontext()
+
+
+# ── Peak memory ─────────────────────────────────────────────────────────────
+
+def reset_peak_rss() -> int:
+    """Reset the RSS high-water mark where Linux allows it; return the baseline in KB.
+
+    A spawned worker inherits its parent's high-water mark through fork+exec,
+    so without the reset ru_maxrss would report the parent's peak.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return peak_rss()
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def peak_rss() -> int:
+    try:
+        with open("/proc/self/status", "r") as f:
+            return int(re.search(r"VmHWM:\s+(\d+)", f.read()).group(1))
+    except (OSError, AttributeError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+# ── Recording ───────────────────────────────────────────────────────────────
+
+class _FileRecord:
+    def __init__(self, path: str):
+        self.path = path
+        self.stages: dict[str, int] = {}
+
+
+class Tracer:
+    def __init__(self, trace_dir: str, profile: bool = False, heap: bool = False):
+        self.dir = trace_dir
+        self.pid = os.getpid()
+        self.profile = cProfile.Profile() if profile else None
+        self.profiled = False
+        self.heap = heap
+        self.current: _FileRecord | None = None
+        os.makedirs(trace_dir, exist_ok=True)
+        self.out = open(os.path.join(trace_dir, f"events-{self.pid}.jsonl"), "a", encoding="utf-8")
+        if heap and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.profile:
+            # Runs at interpreter exit, and when a pool worker shuts down (which
+            # leaves through os._exit, skipping plain atexit hooks).
+            multiprocessing.util.Finalize(self, self.dump_profile, exitpriority=10)
+
+    def dump_profile(self) -> None:
+        if self.profiled:
+            self.profile.dump_stats(os.path.join(self.dir, f"profile-{self.pid}.prof"))
+
+    def emit(self, record: dict) -> None:
+        self.out.write(json.dumps(record) + "\n")
+        self.out.flush()
+
+    @contextlib.contextmanager
+    def span(self, name: str, **args):
+        start = time.monotonic_ns()
+        try:
+            yield
+        finally:
+            dur = time.monotonic_ns() - start
+            record = {
+                "type": "span", "name": name, "ts_us": start // 1000, "dur_us": dur // 1000,
+                "pid": self.pid, "tid": threading.get_native_id(),
+            }
+            if self.current:
+                record["file"] = self.current.path
+                self.current.stages[name] = self.current.stages.get(name, 0) + dur
+            if args:
+                record["args"] = args
+            self.emit(record)
+
+    @contextlib.contextmanager
+    def file_scope(self, path: str, counters: dict[str, int] | None = None):
+        outer, self.current = self.current, _FileRecord(path)
+        before = dict(counters) if counters else {}
+        rss_before = reset_peak_rss()
+        if self.heap:
+            tracemalloc.reset_peak()
+        if self.profile:
+            self.profiled = True
+            self.profile.enable()
+        start = time.monotonic_ns()
+        try:
+            with self.span("file"):
+                yield self.current
+        finally:
+            wall = time.monotonic_ns() - start
+            if self.profile:
+                self.profile.disable()
+            record = {
+                "type": "file", "file": path, "pid": self.pid, "ts_us": start // 1000, "wall_ms": wall / 1e6,
+                "stages_ms": {k: v / 1e6 for k, v in self.current.stages.items() if k != "file"},
+                "peak_rss_kb": max(0, peak_rss() - rss_before),
+            }
+            for key, value in (counters or {}).items():
+                record[key] = value - before.get(key, 0)
+            if self.heap:
+                record["heap_peak_kb"] = tracemalloc.get_traced_memory()[1] // 1024
+            self.emit(record)
+            self.current = outer
+
+
+_tracer: Tracer | None = None
+_checked_pid: int | None = None
+
+
+def tracer() -> Tracer | None:
+    """This process's tracer, created on first use if tracing is enabled."""
+    global _tracer, _checked_pid
+    if _checked_pid != os.getpid():
+        # First call in this process (or in a freshly forked worker).
+        _checked_pid = os.getpid()
+        trace_dir = os.environ.get(TRACE_ENV)
+        _tracer = Tracer(
+            trace_dir,
+            profile=os.environ.get(PROFILE_ENV) == "1",
+            heap=os.environ.get(HEAP_ENV) == "1",
+        ) if trace_dir else None
+    return _tracer
+
+
+def span(name: str, **args):
+    """Time one stage of the current file; a no-op unless tracing."""
+    t = tracer()
+    return t.span(name, **args) if t else _NULL
+
+
+def file_scope(path: str, counters: dict[str, int] | None = None):
+    """Trace one file: stage totals, counter deltas and peak memory; a no-op unless tracing."""
+    t = tracer()
+    return t.file_scope(path, counters) if t else _NULL
+
+
+def enable(trace_dir: str, profile: bool = False, heap: bool = False) -> None:
+    """Turn tracing on for this process and every worker it starts."""
+    global _checked_pid
+    trace_dir = os.path.abspath(trace_dir)
+    os.makedirs(trace_dir, exist_ok=True)
+    for stale in glob.glob(os.path.join(trace_dir, "events-*.jsonl")) + glob.glob(
+        os.path.join(trace_dir, "profile-*.prof")
+    ):
+        os.unlink(stale)
+    os.environ[TRACE_ENV] = trace_dir
+    os.environ[PROFILE_ENV] = "1" if profile else "0"
+    os.environ[HEAP_ENV] = "1" if heap else "0"
+    _checked_pid = None
+
+
+# ── CLI wiring ──────────────────────────────────────────────────────────────
+
+def add_arguments(parser) -> None:
+    """Add --trace DIR, --profile and --trace-heap to an argparse parser."""
+    parser.add_argument("--trace", metavar="DIR",
+                        help="Write per-file stage timings to DIR (trace.jsonl + Chrome trace.json)")
+    parser.add_argument("--profile", action="store_true", help="With --trace, also run cProfile (DIR/profile.prof)")
+    parser.add_argument("--trace-heap", action="store_true", help="With --trace, record Python heap peaks (tracemalloc)")
+
+
+def start(args) -> None:
+    """Enable tracing if the parsed arguments ask for it."""
+    if args.trace:
+        enable(args.trace, profile=args.profile, heap=args.trace_heap)
+
+
+def report(args) -> None:
+    """Merge the trace and print its summary (and hottest functions with --profile)."""
+    summary = finish()
+    if summary:
+        print(summary)
+        if args.profile:
+            top_functions(args.trace)
+
+
+# ── Merging ─────────────────────────────────────────────────────────────────
+
+def finish() -> str | None:
+    """Merge per-process traces into trace.jsonl, trace.json and profile.prof.
+
+    Returns a one-line summary, or None when tracing is off.
+    """
+    trace_dir = os.environ.get(TRACE_ENV)
+    if not trace_dir:
+        return None
+    if _tracer:
+        _tracer.dump_profile()
+        _tracer.out.close()
+
+    records = []
+    for path in sorted(glob.glob(os.path.join(trace_dir, "events-*.jsonl"))):
+        with open(path, "r", encoding="utf-8") as f:
+            records += [json.loads(line) for line in f if line.strip()]
+    records.sort(key=lambda r: r.get("ts_us", 0))
+
+    with open(os.path.join(trace_dir, "trace.jsonl"), "w", encoding="utf-8") as f:
+        for r in records:
+            f.write(json.dumps(r) + "\n")
+
+    events = []
+    for pid in sorted({r["pid"] for r in records}):
+        name = "main" if pid == os.getpid() else f"worker {pid}"
+        events.append({"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": name}})
+    for r in records:
+        if r["type"] != "span":
+            continue
+        args = dict(r.get("args", {}))
+        if "file" in r:
+            args["file"] = r["file"]
+        events.append({
+            "name": r["name"] if r["name"] != "file" else os.path.basename(r.get("file", "file")),
+            "cat": "file" if r["name"] == "file" else "stage",
+            "ph": "X", "ts": r["ts_us"], "dur": r["dur_us"], "pid": r["pid"], "tid": r["tid"],
+            "args": args,
+        })
+    with open(os.path.join(trace_dir, "trace.json"), "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    profiles = sorted(glob.glob(os.path.join(trace_dir, "profile-*.prof")))
+    if profiles:
+        pstats.Stats(*profiles).dump_stats(os.path.join(trace_dir, "profile.prof"))
+
+    files = [r for r in records if r["type"] == "file"]
+    stages: dict[str, float] = {}
+    for r in files:
+        for name, ms in r["stages_ms"].items():
+            stages[name] = stages.get(name, 0.0) + ms
+    breakdown = ", ".join(f"{name} {ms:.1f} ms" for name, ms in sorted(stages.items(), key=lambda kv: -kv[1]))
+    return f"Trace: {len(files)} file(s) in {trace_dir} ({breakdown or 'no stages'})"
+
+
+def top_functions(trace_dir: str, limit: int = 20) -> None:
+    """Print the merged profile's hottest functions by cumulative time."""
+    path = os.path.join(trace_dir, "profile.prof")
+    if os.path.exists(path):
+        pstats.Stats(path).sort_stats("cumulative").print_stats(limit)
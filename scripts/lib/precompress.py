@@ -0,0 +1,194 @@
+"""
+Precompressed `.gz` / `.br` siblings for the text assets in `publish/`.
+
+publish.ts writes chapters, quizzes, transcripts and JSON uncompressed, so a
+static host either compresses them on every request or serves them raw. This
+stage writes `<file>.gz` (and `<file>.br` when the `brotli` package is
+installed) next to every text asset, streaming each file in bounded chunks.
+
+`precompress-manifest.json`, kept next to `publish/` like the patch manifest,
+records each asset's content hash and the encodings written for it. A re-run
+skips files whose size/mtime still match, and files whose content hash is
+unchanged only have their entry refreshed, so only assets that actually
+changed are compressed again.
+"""
+
+import gzip
+import hashlib
+import os
+from dataclasses import dataclass, field
+
+from build_state import JsonManifest
+from pipeline_trace import file_scope, span
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only .gz siblings are written.
+    brotli = None
+
+MANIFEST_NAME = "precompress-manifest.json"
+MANIFEST_VERSION = 1
+
+TEXT_EXTENSIONS = {".html", ".htm", ".css", ".js", ".mjs", ".json", ".md", ".txt", ".svg", ".xml", ".csv"}
+SUFFIXES = {"gzip": ".gz", "br": ".br"}
+
+# Files smaller than this gain nothing from compression once headers are counted.
+MIN_SIZE = 256
+CHUNK = 1 << 20
+
+
+def available_encodings() -> list[str]:
+    return ["gzip", "br"] if brotli else ["gzip"]
+
+
+@dataclass
+class CompressResult:
+    path: str
+    sha256: str = ""
+    size: int = 0
+    mtime_ns: int = 0
+    encodings: dict[str, int] = field(default_factory=dict)
+    compressed: bool = False
+    error: str | None = None
+
+
+def find_assets(publish_dir: str) -> list[str]:
+    """Every compressible text asset under `publish_dir`, skipping hidden dirs."""
+    found = []
+    for dirpath, dirnames, filenames in os.walk(publish_dir):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1].lower() in TEXT_EXTENSIONS:
+                found.append(os.path.join(dirpath, name))
+    return found
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _write_gzip(src, dest: str, level: int) -> None:
+    with open(dest, "wb") as raw:
+        # mtime=0 and no filename keep the output byte-identical across runs.
+        with gzip.GzipFile(filename="", mode="wb", compresslevel=level, fileobj=raw, mtime=0) as gz:
+            while chunk := src.read(CHUNK):
+                gz.write(chunk)
+
+
+def _write_brotli(src, dest: str, level: int) -> None:
+    compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=level)
+    with open(dest, "wb") as out:
+        while chunk := src.read(CHUNK):
+            out.write(compressor.process(chunk))
+        out.write(compressor.finish())
+
+
+WRITERS = {"gzip": _write_gzip, "br": _write_brotli}
+
+
+def _remove_stale_siblings(path: str, written: dict[str, int]) -> None:
+    """Delete every sibling of `path` not written in this run, so none outlives its content."""
+    for enc, suffix in SUFFIXES.items():
+        if enc not in written:
+            try:
+                os.unlink(path + suffix)
+            except FileNotFoundError:
+                pass
+
+
+def compress_file(path: str, encodings: list[str], previous: dict | None = None,
+                  gzip_level: int = 9, brotli_level: int = 11) -> CompressResult:
+    """Write the requested siblings for `path` unless `previous` shows they are current.
+
+    Siblings that are not (re)written here are deleted: a file that shrank
+    under MIN_SIZE, or an encoding that is no longer available, must not leave
+    a host serving compressed bytes of the old content.
+    """
+    result = CompressResult(path)
+    with file_scope(path):
+        try:
+            st = os.stat(path)
+            result.size, result.mtime_ns = st.st_size, st.st_mtime_ns
+            with span("hash"):
+                result.sha256 = _file_sha256(path)
+            if st.st_size < MIN_SIZE:
+                _remove_stale_siblings(path, result.encodings)
+                return result
+
+            if (
+                previous
+                and previous["sha256"] == result.sha256
+                and all(
+                    enc in previous["encodings"] and os.path.exists(path + SUFFIXES[enc])
+                    for enc in encodings
+                )
+            ):
+                result.encodings = {enc: previous["encodings"][enc] for enc in encodings}
+                return result
+
+            levels = {"gzip": gzip_level, "br": brotli_level}
+            for enc in encodings:
+                dest = path + SUFFIXES[enc]
+                tmp = dest + ".tmp"
+                with span(enc), open(path, "rb") as src:
+                    WRITERS[enc](src, tmp, levels[enc])
+                os.replace(tmp, dest)
+                result.encodings[enc] = os.path.getsize(dest)
+            _remove_stale_siblings(path, result.encodings)
+            result.compressed = True
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+    return result
+
+
+class Manifest(JsonManifest):
+    VERSION = MANIFEST_VERSION
+    SECTION = "files"
+
+    def __init__(self, publish_dir: str):
+        self.publish_dir = publish_dir
+        super().__init__(os.path.join(os.path.dirname(os.path.abspath(publish_dir)), MANIFEST_NAME))
+
+    def key(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), os.path.abspath(self.publish_dir)).replace(os.sep, "/")
+
+    def get(self, path: str) -> dict | None:
+        return self.entries.get(self.key(path))
+
+    def is_current(self, path: str, encodings: list[str]) -> bool:
+        entry = self.get(path)
+        if not entry:
+            return False
+        st = os.stat(path)
+        return (
+            (entry["size"], entry["mtime_ns"]) == (st.st_size, st.st_mtime_ns)
+            and (st.st_size < MIN_SIZE or all(
+                enc in entry["encodings"] and os.path.exists(path + SUFFIXES[enc]) for enc in encodings
+            ))
+        )
+
+    def record(self, result: CompressResult) -> None:
+        self.entries[self.key(result.path)] = {
+            "sha256": result.sha256,
+            "size": result.size,
+            "mtime_ns": result.mtime_ns,
+            "encodings": result.encodings,
+        }
+        self.dirty = True
+
+    def prune(self, live: set[str]) -> list[str]:
+        """Forget assets that no longer exist and delete their siblings. Returns removed paths."""
+        removed = []
+        for key in [k for k in self.entries if k not in live]:
+            for suffix in SUFFIXES.values():
+                sibling = os.path.join(self.publish_dir, key + suffix)
+                if os.path.exists(sibling):
+                    os.unlink(sibling)
+                    removed.append(sibling)
+            del self.entries[key]
+            self.dirty = True
+        return removed
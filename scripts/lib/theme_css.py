@@ -0,0 +1,109 @@
+"""
+Hoist the per-chapter theme stylesheet into one shared, cacheable file.
+
+Every chapter embeds the full `<style>` block from src/prompts/chapter.ts, so
+a 12-chapter course ships (and the browser parses) the same CSS twelve times.
+This stage finds the head `<style>` block of each published chapter, groups
+chapters by its content hash, writes each block shared by at least
+`min_share` chapters once as `publish/theme.<hash>.css`, and swaps the inline
+copies for a `<link>`.
+"""
+
+import hashlib
+import mmap
+import os
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+
+from pipeline_trace import file_scope, span
+from widget_patch import COUNTERS, replace_spliced
+
+STYLE_RE = re.compile(rb"<style\b[^>]*>(.*?)</style\s*>", re.IGNORECASE | re.DOTALL)
+HASH_LEN = 16
+
+
+@dataclass
+class StyleBlock:
+    path: str
+    start: int
+    end: int
+    sha256: str
+    size: int
+    error: str | None = None
+
+
+@dataclass
+class LinkResult:
+    path: str
+    bytes_before: int = 0
+    bytes_after: int = 0
+    error: str | None = None
+
+
+def find_theme_style(path: str) -> StyleBlock | None:
+    """The first `<style>` block inside the chapter's `<head>`, if any.
+
+    A chapter that cannot be read comes back as a block with `error` set.
+    """
+    with file_scope(path), span("scan"):
+        try:
+            if not os.path.getsize(path):
+                return None
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                head_end = mapped.find(b"</head>")
+                m = STYLE_RE.search(mapped, 0, head_end if head_end >= 0 else len(mapped))
+                if not m:
+                    return None
+                css = m.group(1)
+                return StyleBlock(path, m.start(), m.end(), hashlib.sha256(css).hexdigest(), len(css))
+        except OSError as e:
+            return StyleBlock(path, 0, 0, "", 0, error=str(e))
+
+
+def stylesheet_name(sha256: str) -> str:
+    return f"theme.{sha256[:HASH_LEN]}.css"
+
+
+def write_stylesheet(block: StyleBlock, publish_dir: str) -> str:
+    """Write the block's CSS as publish/theme.<hash>.css (once). Returns the path."""
+    dest = os.path.join(publish_dir, stylesheet_name(block.sha256))
+    if os.path.exists(dest):
+        return dest
+    with open(block.path, "rb") as f:
+        f.seek(block.start)
+        m = STYLE_RE.match(f.read(block.end - block.start))
+    tmp = dest + ".tmp"
+    with open(tmp, "wb") as out:
+        out.write(m.group(1).strip(b"\n") + b"\n")
+    os.replace(tmp, dest)
+    return dest
+
+
+def link_stylesheet(block: StyleBlock, stylesheet: str) -> LinkResult:
+    """Replace the chapter's inline block with a <link> to `stylesheet`."""
+    result = LinkResult(block.path)
+    href = os.path.relpath(stylesheet, os.path.dirname(block.path)).replace(os.sep, "/")
+    link = f'<link rel="stylesheet" href="{href}">'.encode()
+    with file_scope(block.path, COUNTERS):
+        try:
+            with open(block.path, "rb") as src, mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                m = STYLE_RE.match(mapped, block.start)
+                if not m or m.end() != block.end or hashlib.sha256(m.group(1)).hexdigest() != block.sha256:
+                    raise ValueError("chapter changed since it was scanned")
+                result.bytes_before = len(mapped)
+                with span("write"):
+                    edits = [(block.start, block.end, link)]
+                    result.bytes_after = replace_spliced(block.path, mapped, edits, src.fileno())
+        except (OSError, ValueError) as e:
+            result.error = str(e)
+    return result
+
+
+def group_blocks(blocks: list[StyleBlock], min_share: int) -> dict[str, list[StyleBlock]]:
+    """Style blocks by content hash, keeping only those shared by `min_share`+ chapters."""
+    groups: dict[str, list[StyleBlock]] = defaultdict(list)
+    for block in blocks:
+        if not block.error:
+            groups[block.sha256].append(block)
+    return {sha: group for sha, group in groups.items() if len(group) >= min_share}
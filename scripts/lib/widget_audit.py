@@ -0,0 +1,161 @@
+"""
+Static health checks for generated chapter widgets.
+
+src/prompts/chapter.ts requires every widget to be a `.widget-container` div
+plus a script block that wraps ALL its logic in an IIFE with try/catch and a
+styled fallback. For each widget in the chapter index this checks that:
+
+  - a script block references the container (error if not)
+  - the script tokenizes cleanly: strings, templates, regexes, brackets (error)
+  - every literal getElementById / querySelector('#...') target exists,
+    either in the page or as an id the script itself creates (error)
+  - the script is an IIFE (warning)
+  - the IIFE body is a try/catch, with nothing before the try (warning)
+  - the catch block writes a fallback via innerHTML/textContent (warning)
+
+Chapters are ranked by a score of 10 per error and 3 per warning.
+"""
+
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+from chapter_index import load_index
+from js_syntax import Token, check_syntax
+from pipeline_trace import file_scope, span
+
+ERROR_WEIGHT = 10
+WARNING_WEIGHT = 3
+
+# Matches id="x", id='x', escaped id=\"x\" inside JS strings, and el.id = 'x'.
+ANY_ID_RE = re.compile(rb"""\bid\s*=\s*\\?["']([^"'\\]+)""")
+ELEMENT_REF_RE = re.compile(
+    r"""getElementById\(\s*(['"])([^'"]+)\1\s*\)"""
+    r"""|querySelector(?:All)?\(\s*(['"])#([\w-]+)\3\s*\)"""
+)
+
+
+@dataclass
+class Issue:
+    widget_id: str
+    severity: str  # "error" | "warning"
+    message: str
+
+
+@dataclass
+class ChapterReport:
+    path: str
+    widgets: int = 0
+    issues: list[Issue] = field(default_factory=list)
+    error: str | None = None
+
+    @property
+    def score(self) -> int:
+        weights = {"error": ERROR_WEIGHT, "warning": WARNING_WEIGHT}
+        return sum(weights[i.severity] for i in self.issues) + (ERROR_WEIGHT if self.error else 0)
+
+
+def _check_structure(tokens: list[Token]) -> list[tuple[str, str]]:
+    """IIFE, try/catch and fallback checks on a widget's token stream."""
+    problems = []
+    values = [t.value for t in tokens if t.kind == "punct" or t.kind == "ident"]
+    while values and values[-1] == ";":
+        values.pop()
+    is_iife = (
+        len(values) >= 4
+        and values[0] == "("
+        and values[1] in ("function", "async", "(")
+        and values[-1] == ")"
+    )
+    if not is_iife:
+        problems.append(("warning", "script is not wrapped in an IIFE"))
+
+    depth = 0
+    first_statement = None
+    after_directive = False
+    try_seen = catch_at = None
+    for n, t in enumerate(tokens):
+        if t.kind == "punct" and t.value == "{":
+            depth += 1
+            continue
+        if t.kind == "punct" and t.value == "}":
+            depth -= 1
+            if catch_at is not None and depth == 1:
+                break
+            continue
+        if depth != 1:
+            continue
+        if first_statement is None:
+            if t.kind == "string" and t.value[1:-1] == "use strict":
+                after_directive = True
+                continue
+            if after_directive and t.kind == "punct" and t.value == ";":
+                after_directive = False  # The directive's own terminator is not code.
+                continue
+            first_statement = t
+        if t.kind == "ident" and t.value == "try" and try_seen is None:
+            try_seen = n
+        elif t.kind == "ident" and t.value == "catch" and try_seen is not None:
+            catch_at = n
+
+    if try_seen is None or catch_at is None:
+        problems.append(("warning", "logic is not wrapped in try/catch"))
+        return problems
+    if first_statement is not None and first_statement.value != "try":
+        problems.append(("warning", f"code runs before the try block (line {first_statement.line})"))
+    handler = tokens[catch_at:n + 1]
+    if not any(t.kind == "ident" and t.value in ("innerHTML", "textContent") for t in handler):
+        problems.append(("warning", "catch block does not render a fallback"))
+    return problems
+
+
+def audit_chapter(path: str) -> ChapterReport:
+    report = ChapterReport(path)
+    with file_scope(path):
+        try:
+            with span("index"):
+                index = load_index(path)
+            report.widgets = len(index.widgets)
+            if not index.widgets:
+                return report
+
+            with span("read"), open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                page_ids = {i.decode("utf-8", "replace") for i in ANY_ID_RE.findall(mapped)}
+                bodies = {w.widget_id: mapped[w.body[0]:w.body[1]] for w in index.widgets if w.body}
+
+            for w in index.widgets:
+                body = bodies.get(w.widget_id)
+                if body is None:
+                    report.issues.append(Issue(w.widget_id, "error", "no script block references this widget"))
+                    continue
+                src = body.decode("utf-8", "replace")
+
+                for m in ELEMENT_REF_RE.finditer(src):
+                    ref = m.group(2) or m.group(4)
+                    if ref not in page_ids:
+                        line = src.count("\n", 0, m.start()) + 1
+                        message = f"#{ref} does not exist (script line {line})"
+                        report.issues.append(Issue(w.widget_id, "error", message))
+
+                with span("tokenize"):
+                    tokens, err = check_syntax(src)
+                if err:
+                    report.issues.append(Issue(w.widget_id, "error", f"JS syntax: {err}"))
+                    continue
+                for severity, message in _check_structure(tokens):
+                    report.issues.append(Issue(w.widget_id, severity, message))
+        except (OSError, ValueError) as e:
+            report.error = str(e)
+    return report
+
+
+def audit_chapters(files: list[str], jobs: int | None = None) -> list[ChapterReport]:
+    """Audit `files` in a process pool, worst chapters first."""
+    if not files:
+        return []
+    jobs = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(jobs) as pool:
+        reports = list(pool.map(audit_chapter, files, chunksize=max(1, len(files) // (jobs * 4))))
+    return sorted(reports, key=lambda r: (-r.score, r.path))
@@ -0,0 +1,177 @@
+"""
+SQLite library of every widget across a set of generated courses.
+
+Each widget's container HTML and script IIFE are pulled out of its chapter by
+seeking to the offsets in the chapter index, and stored once per
+normalized-content hash. Only a chapter whose index is stale is hashed (and
+re-parsed) in full, and that happens in the pool workers. Whitespace is collapsed
+before hashing, so the same widget re-indented in another chapter still
+deduplicates. An occurrences table records where each copy lives.
+
+    widgets(hash, container, script, bytes)
+    occurrences(chapter, course, widget_id, number, title, hash, bytes)
+    chapters(path, course, sha256)
+
+Chapters whose hash has not changed since the last build are skipped, and
+chapters that no longer exist on disk are dropped.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from chapter_index import load_index
+from patch_manifest import course_root
+from pipeline_trace import file_scope, span
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS widgets (
+    hash TEXT PRIMARY KEY,
+    container TEXT NOT NULL,
+    script TEXT,
+    bytes INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chapters (
+    path TEXT PRIMARY KEY,
+    course TEXT NOT NULL,
+    sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS occurrences (
+    chapter TEXT NOT NULL REFERENCES chapters(path) ON DELETE CASCADE,
+    course TEXT NOT NULL,
+    widget_id TEXT NOT NULL,
+    number INTEGER,
+    title TEXT,
+    hash TEXT NOT NULL REFERENCES widgets(hash),
+    bytes INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS occurrences_hash ON occurrences(hash);
+CREATE INDEX IF NOT EXISTS occurrences_widget ON occurrences(widget_id);
+"""
+
+WHITESPACE_RE = re.compile(rb"\s+")
+
+
+@dataclass
+class ExtractedWidget:
+    widget_id: str
+    number: int | None
+    title: str | None
+    hash: str
+    container: str
+    script: str | None
+    bytes: int
+
+
+def normalized_hash(container: bytes, script: bytes | None) -> str:
+    digest = hashlib.sha256(WHITESPACE_RE.sub(b" ", container).strip())
+    digest.update(b"\0")
+    if script is not None:
+        digest.update(WHITESPACE_RE.sub(b" ", script).strip())
+    return digest.hexdigest()
+
+
+def extract_chapter(path: str, known_sha256: str | None = None) -> tuple[str, str, list[ExtractedWidget] | None]:
+    """Return (path, sha256, widgets) for one chapter, reading only widget spans.
+
+    `widgets` is None when the chapter still hashes to `known_sha256`.
+    """
+    with file_scope(path):
+        with span("index"):
+            index = load_index(path)
+        if index.sha256 == known_sha256:
+            return path, index.sha256, None
+        widgets = []
+        with span("read"), open(path, "rb") as f:
+            for w in index.widgets:
+                f.seek(w.container[0])
+                container = f.read(w.container[1] - w.container[0])
+                script = None
+                if w.body:
+                    f.seek(w.body[0])
+                    script = f.read(w.body[1] - w.body[0])
+                widgets.append(ExtractedWidget(
+                    w.widget_id,
+                    w.number,
+                    w.title,
+                    normalized_hash(container, script),
+                    container.decode("utf-8", "replace"),
+                    script.decode("utf-8", "replace") if script is not None else None,
+                    len(container) + len(script or b""),
+                ))
+        return path, index.sha256, widgets
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def build_library(db_path: str, files: list[str], jobs: int | None = None) -> tuple[int, int]:
+    """Add or refresh `files` in the library. Returns (chapters extracted, chapters skipped)."""
+    conn = connect(db_path)
+    known = dict(conn.execute("SELECT path, sha256 FROM chapters"))
+    paths = [os.path.abspath(p) for p in files]
+    extracted = 0
+
+    with ProcessPoolExecutor(jobs) as pool, conn:
+        gone = [(p,) for p in known if not os.path.exists(p)]
+        conn.executemany("DELETE FROM chapters WHERE path = ?", gone)
+        results = pool.map(extract_chapter, paths, [known.get(p) for p in paths],
+                           chunksize=max(1, len(paths) // 64))
+        for path, sha, widgets in results:
+            if widgets is None:
+                continue
+            extracted += 1
+            course = os.path.basename(course_root(path))
+            conn.execute("DELETE FROM chapters WHERE path = ?", (path,))
+            conn.execute("INSERT INTO chapters VALUES (?, ?, ?)", (path, course, sha))
+            for w in widgets:
+                conn.execute(
+                    "INSERT OR IGNORE INTO widgets VALUES (?, ?, ?, ?)",
+                    (w.hash, w.container, w.script, w.bytes),
+                )
+                conn.execute(
+                    "INSERT INTO occurrences VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (path, course, w.widget_id, w.number, w.title, w.hash, w.bytes),
+                )
+        conn.execute("DELETE FROM widgets WHERE hash NOT IN (SELECT hash FROM occurrences)")
+    conn.close()
+    return extracted, len(paths) - extracted
+
+
+def grep(db_path: str, needle: str) -> list[tuple]:
+    """Occurrences of every widget whose container or script contains `needle`."""
+    conn = connect(db_path)
+    rows = conn.execute(
+        """
+        SELECT o.course, o.chapter, o.widget_id, o.title, o.hash, o.bytes
+        FROM widgets w JOIN occurrences o ON o.hash = w.hash
+        WHERE instr(w.script, ?) > 0 OR instr(w.container, ?) > 0
+        ORDER BY o.course, o.chapter, o.number
+        """,
+        (needle, needle),
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def duplicates(db_path: str, min_count: int = 2) -> list[tuple]:
+    """Widgets that appear in `min_count` or more places, most copies first."""
+    conn = connect(db_path)
+    rows = conn.execute(
+        """
+        SELECT hash, COUNT(*) AS copies, MIN(widget_id), MIN(title), MAX(bytes)
+        FROM occurrences GROUP BY hash HAVING copies >= ?
+        ORDER BY copies DESC, MAX(bytes) DESC
+        """,
+        (min_count,),
+    ).fetchall()
+    conn.close()
+    return rows
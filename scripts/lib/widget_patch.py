@@ -0,0 +1,525 @@
+"""
+Batch widget-patch engine for generated chapter HTML.
+
+A patch spec is a list of WidgetPatch entries, each naming a widget by the id
+of its `.widget-container` div and supplying replacement container HTML
+and/or a replacement script body (the IIFE). The engine finds every
+`chapters/*.html` under one or more output roots and applies the spec to each
+file that contains a targeted widget, spreading files over a process pool.
+
+Spec files are either Python (a module defining `PATCHES`) or JSON:
+
+    [
+      {
+        "widget_id": "widget-drafting-room",
+        "container_html": "<div class=\\"widget-container\\" ...>...</div>",
+        "script_file": "drafting-room.js",
+        "expect": "Crisis Statement Drafting Room",
+        "path_glob": "*/leadership-through-crisis/chapters/05_*.html"
+      }
+    ]
+
+`container_file` / `script_file` paths are resolved relative to the spec.
+
+A fix written for one chapter should carry a guard, since widget ids repeat
+across courses: `expect` is text the widget's current container or script
+must contain, and `path_glob` is an fnmatch pattern the chapter's absolute
+path must match. A guarded patch leaves non-matching widgets alone and
+reports them as missing.
+"""
+
+import hashlib
+import fnmatch
+import json
+import mmap
+import os
+import runpy
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+from chapter_index import WidgetEntry, load_index, sha256_bytes
+from patch_manifest import Manifest, course_root, spec_hash
+from patch_txn import Transaction, TransactionError, stage_path
+from pipeline_trace import file_scope, span
+
+
+@dataclass(frozen=True)
+class WidgetPatch:
+    widget_id: str
+    container_html: str | None = None
+    script_js: str | None = None
+    expect: str | None = None
+    path_glob: str | None = None
+
+    def applies_to(self, path: str) -> bool:
+        return self.path_glob is None or fnmatch.fnmatch(
+            os.path.abspath(path).replace(os.sep, "/"), self.path_glob
+        )
+
+
+@dataclass
+class FileResult:
+    path: str
+    applied: list[str] = field(default_factory=list)
+    missing: list[str] = field(default_factory=list)
+    error: str | None = None
+    size: int = 0
+    skipped: bool = False
+    written: bool = False
+    input_sha256: str | None = None
+    output_sha256: str | None = None
+    input_stat: tuple[int, int] | None = None
+    staged: str | None = None
+
+
+class PatchError(Exception):
+    pass
+
+
+# Bytes pulled into or pushed out of Python buffers, and bytes the kernel copied
+# file-to-file on our behalf. Per process; read by the benchmarks.
+COUNTERS = {"bytes_read": 0, "bytes_written": 0, "bytes_copied": 0}
+
+
+# ── Spec loading ────────────────────────────────────────────────────────────
+
+def load_spec(path: str) -> list[WidgetPatch]:
+    """Load a patch spec from a .py module (defining PATCHES) or a .json file."""
+    if path.endswith(".py"):
+        patches = runpy.run_path(path, run_name="__spec__").get("PATCHES")
+        if not patches:
+            raise PatchError(f"{path} does not define PATCHES")
+        return list(patches)
+
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    if not isinstance(entries, list) or not all(isinstance(e, dict) and "widget_id" in e for e in entries):
+        raise PatchError(f"{path} must be a JSON list of objects with a widget_id")
+
+    base = os.path.dirname(os.path.abspath(path))
+    patches = []
+    for entry in entries:
+        container = entry.get("container_html")
+        script = entry.get("script_js")
+        if "container_file" in entry:
+            with open(os.path.join(base, entry["container_file"]), "r", encoding="utf-8") as f:
+                container = f.read()
+        if "script_file" in entry:
+            with open(os.path.join(base, entry["script_file"]), "r", encoding="utf-8") as f:
+                script = f.read()
+        if container is None and script is None:
+            raise PatchError(f"Patch for {entry['widget_id']} replaces nothing")
+        patches.append(WidgetPatch(
+            entry["widget_id"], container, script, entry.get("expect"), entry.get("path_glob"),
+        ))
+    return patches
+
+
+# ── Planning and writing ────────────────────────────────────────────────────
+
+Edit = tuple[int, int, bytes]
+
+
+def script_body(js: str) -> bytes:
+    return ("\n  " + js.strip() + "\n  ").encode("utf-8")
+
+
+def _guard_holds(patch: WidgetPatch, widget: WidgetEntry, data: bytes | None) -> bool:
+    """True if the widget still looks like what `patch.expect` was written against."""
+    if patch.expect is None:
+        return True
+    if data is None:
+        raise PatchError(f"Patch for {patch.widget_id} has a guard but no chapter bytes were given")
+    needle = patch.expect.encode("utf-8")
+    regions = [widget.container] + ([widget.body] if widget.body else [])
+    if any(data.find(needle, start, end) >= 0 for start, end in regions):
+        return True
+    # Already patched: a re-run stays a no-op instead of reporting the widget missing.
+    start, end = widget.container
+    return patch.container_html is not None and data[start:end] == patch.container_html.strip().encode("utf-8")
+
+
+def plan_patches(
+    patches: list[WidgetPatch],
+    widgets: list[WidgetEntry],
+    data: bytes | None = None,
+) -> tuple[list[Edit], list[str], list[str]]:
+    """Collect every edit as (start, end, replacement) from the chapter's index.
+
+    Offsets all refer to the original document, so no edit shifts another.
+    `data` (the chapter) is needed to check `expect` guards; a widget whose
+    guard fails counts as missing. Returns (edits sorted by start, applied
+    widget ids, missing widget ids).
+    """
+    by_id = {w.widget_id: w for w in widgets}
+    edits: list[Edit] = []
+    applied, missing = [], []
+
+    for patch in patches:
+        widget = by_id.get(patch.widget_id)
+        if widget is None or not _guard_holds(patch, widget, data):
+            missing.append(patch.widget_id)
+            continue
+        if patch.script_js is not None:
+            if widget.body is None:
+                raise PatchError(f"No script block references #{patch.widget_id}")
+            edits.append((*widget.body, script_body(patch.script_js)))
+        if patch.container_html is not None:
+            edits.append((*widget.container, patch.container_html.strip().encode("utf-8")))
+        applied.append(patch.widget_id)
+
+    edits.sort()
+    for (_, prev_end, _), (start, _, _) in zip(edits, edits[1:]):
+        if start < prev_end:
+            raise PatchError(f"Overlapping edits at byte {start}")
+    return edits, applied, missing
+
+
+def write_spliced(data: bytes, edits: list[Edit], out) -> int:
+    """Stream `data` to `out` with `edits` applied. Returns bytes written.
+
+    Untouched regions go out as memoryview slices, so the document is never
+    copied; peak memory stays at one input buffer however many edits there are.
+    """
+    pos = written = 0
+    with memoryview(data) as view:
+        for start, end, replacement in edits:
+            written += out.write(view[pos:start])
+            written += out.write(replacement)
+            pos = end
+        written += out.write(view[pos:])
+    return written
+
+
+# ── Memory-mapped streaming ─────────────────────────────────────────────────
+# Untouched regions (mostly `data:image/...;base64` runs) are copied file to
+# file by the kernel, so Python only ever holds the edits themselves.
+
+_zero_copy = hasattr(os, "copy_file_range") or hasattr(os, "sendfile")
+
+
+def _copy_range(src_fd: int, dst_fd: int, offset: int, count: int, view: memoryview) -> None:
+    """Append src[offset:offset + count] to dst, zero-copy where the OS allows."""
+    global _zero_copy
+    while count > 0:
+        n = 0
+        if _zero_copy:
+            try:
+                if hasattr(os, "copy_file_range"):
+                    n = os.copy_file_range(src_fd, dst_fd, count, offset)
+                else:
+                    n = os.sendfile(dst_fd, src_fd, offset, count)
+                COUNTERS["bytes_copied"] += n
+            except OSError:
+                _zero_copy = False
+        if not n:
+            n = os.write(dst_fd, view[offset:offset + count])
+            COUNTERS["bytes_written"] += n
+        offset += n
+        count -= n
+
+
+def write_spliced_fd(src_fd: int, mapped: mmap.mmap, edits: list[Edit], dst_fd: int) -> int:
+    """Like write_spliced(), but copies untouched ranges between file descriptors."""
+    pos = written = 0
+    with memoryview(mapped) as view:
+        for start, end, replacement in edits:
+            _copy_range(src_fd, dst_fd, pos, start - pos, view)
+            written += start - pos
+            replacement = memoryview(replacement)
+            while replacement:
+                n = os.write(dst_fd, replacement)
+                COUNTERS["bytes_written"] += n
+                replacement = replacement[n:]
+                written += n
+            pos = end
+        _copy_range(src_fd, dst_fd, pos, len(mapped) - pos, view)
+    return written + len(mapped) - pos
+
+
+def write_spliced_file(
+    dest: str,
+    mode: int,
+    data: bytes,
+    edits: list[Edit],
+    src_fd: int | None = None,
+    fsync: bool = False,
+) -> int:
+    """Write `data` with `edits` applied to a new file at `dest`.
+
+    With `src_fd` (the descriptor `data` is mapped from), untouched ranges are
+    copied file-to-file; otherwise they are written from `data`.
+    """
+    dst_fd = os.open(dest, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    try:
+        if src_fd is not None:
+            written = write_spliced_fd(src_fd, data, edits, dst_fd)
+        else:
+            with open(dst_fd, "wb", closefd=False) as out:
+                written = write_spliced(data, edits, out)
+            COUNTERS["bytes_written"] += written
+        if fsync:
+            os.fsync(dst_fd)
+    except BaseException:
+        os.close(dst_fd)
+        os.unlink(dest)
+        raise
+    os.close(dst_fd)
+    return written
+
+
+def replace_spliced(path: str, data: bytes, edits: list[Edit], src_fd: int | None = None) -> int:
+    """Write the spliced file beside `path`, then atomically rename it over `path`."""
+    tmp = path + ".tmp"
+    written = write_spliced_file(tmp, os.stat(path).st_mode & 0o777, data, edits, src_fd)
+    os.replace(tmp, path)
+    return written
+
+
+class HashSink:
+    """File-like sink that only hashes what is written to it."""
+
+    def __init__(self):
+        self.digest = hashlib.sha256()
+
+    def write(self, chunk) -> int:
+        self.digest.update(chunk)
+        return len(chunk)
+
+    def hexdigest(self) -> str:
+        return self.digest.hexdigest()
+
+
+def _patch_data(
+    path: str,
+    data: bytes,
+    src_fd: int | None,
+    input_sha256: str,
+    patches: list[WidgetPatch],
+    widgets: list[WidgetEntry],
+    result: FileResult,
+    dry_run: bool,
+    txn_id: str | None,
+) -> None:
+    result.input_sha256 = result.output_sha256 = input_sha256
+    targeted = [
+        p for p in patches
+        if p.applies_to(path) and any(w.widget_id == p.widget_id for w in widgets)
+    ]
+    result.missing = [p.widget_id for p in patches if p not in targeted]
+    with span("plan"):
+        edits, result.applied, guarded = plan_patches(targeted, widgets, data)
+    result.missing += guarded
+    result.size = len(data) + sum(len(r) - (e - s) for s, e, r in edits)
+    if not edits:
+        return
+
+    # Only rewrite (and bump the mtime) when the bytes actually change.
+    with span("hash"):
+        sink = HashSink()
+        write_spliced(data, edits, sink)
+        result.output_sha256 = sink.hexdigest()
+    if result.output_sha256 == input_sha256 or dry_run:
+        return
+    with span("write"):
+        if txn_id is None:
+            replace_spliced(path, data, edits, src_fd)
+            result.written = True
+        else:
+            result.staged = stage_path(path, txn_id)
+            os.makedirs(os.path.dirname(result.staged), exist_ok=True)
+            write_spliced_file(result.staged, os.stat(path).st_mode & 0o777, data, edits, src_fd, fsync=True)
+
+
+def patch_file(
+    path: str,
+    patches: list[WidgetPatch],
+    dry_run: bool = False,
+    use_mmap: bool = False,
+    expected_sha256: str | None = None,
+    txn_id: str | None = None,
+) -> FileResult:
+    """Apply `patches` to one chapter.
+
+    `expected_sha256` is the output hash recorded by a previous run; a chapter
+    that still hashes to it is skipped. With `txn_id` the output is only
+    staged (see patch_txn) and `result.staged` names the staged file.
+    """
+    result = FileResult(path)
+    with file_scope(path, COUNTERS):
+        try:
+            _patch_path(path, patches, result, dry_run, use_mmap, expected_sha256, txn_id)
+        except (OSError, PatchError) as e:
+            result.error = str(e)
+    return result
+
+
+def _patch_path(
+    path: str,
+    patches: list[WidgetPatch],
+    result: FileResult,
+    dry_run: bool,
+    use_mmap: bool,
+    expected_sha256: str | None,
+    txn_id: str | None,
+) -> None:
+    if use_mmap and os.path.getsize(path):
+        with span("index"):
+            index = load_index(path)
+        if index.sha256 == expected_sha256:
+            result.skipped = True
+            result.input_sha256 = result.output_sha256 = expected_sha256
+            return
+        with open(path, "rb") as src, mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            st = os.fstat(src.fileno())
+            if (st.st_size, st.st_mtime_ns) != (index.size, index.mtime_ns):
+                raise PatchError("Chapter changed while patching")
+            result.input_stat = (st.st_size, st.st_mtime_ns)
+            _patch_data(path, mapped, src.fileno(), index.sha256, patches, index.widgets, result,
+                        dry_run, txn_id)
+        return
+
+    with span("read"):
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            data = f.read()
+    COUNTERS["bytes_read"] += len(data)
+    result.input_stat = (st.st_size, st.st_mtime_ns)
+    with span("scan"):
+        targeted = any(p.widget_id.encode() in data for p in patches)
+    if not targeted:
+        result.input_sha256 = result.output_sha256 = sha256_bytes(data)
+        result.skipped = result.input_sha256 == expected_sha256
+        result.missing = [p.widget_id for p in patches]
+        return
+    with span("index"):
+        index = load_index(path, data)
+    if index.sha256 == expected_sha256:
+        result.skipped = True
+        result.input_sha256 = result.output_sha256 = expected_sha256
+        return
+    _patch_data(path, data, None, index.sha256, patches, index.widgets, result, dry_run, txn_id)
+
+
+# ── Batch runner ────────────────────────────────────────────────────────────
+
+def find_chapters(roots: list[str]) -> list[str]:
+    """Every chapters/*.html under the given output roots, sorted."""
+    found = set()
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".") and d != "node_modules"]
+            if os.path.basename(dirpath) != "chapters":
+                continue
+            found.update(os.path.join(dirpath, n) for n in filenames if n.endswith(".html"))
+    return sorted(found)
+
+
+_worker_patches: list[WidgetPatch] = []
+_worker_options: dict = {}
+
+
+def _init_worker(patches: list[WidgetPatch], options: dict) -> None:
+    global _worker_patches, _worker_options
+    _worker_patches = patches
+    _worker_options = options
+
+
+def _patch_one(task: tuple[str, str | None]) -> FileResult:
+    return patch_file(task[0], _worker_patches, expected_sha256=task[1], **_worker_options)
+
+
+def run_batch(
+    files: list[str],
+    patches: list[WidgetPatch],
+    jobs: int | None = None,
+    dry_run: bool = False,
+    use_mmap: bool = False,
+    force: bool = False,
+    transaction_roots: list[str] | None = None,
+) -> list[FileResult]:
+    """Patch `files` in a process pool. Patches are shipped once per worker.
+
+    Each course's patch manifest is consulted first: chapters whose size and
+    mtime match the recorded output for this spec are skipped without being
+    opened. Pass `force` to ignore the manifests.
+
+    With `transaction_roots` (journal and lock under the first), outputs are
+    staged and committed all-or-nothing (see patch_txn): if any chapter fails,
+    no chapter is changed.
+    """
+    spec = spec_hash(patches)
+    manifests: dict[str, Manifest] = {}
+    results: list[FileResult] = []
+    tasks: list[tuple[str, str | None]] = []
+    recorded: dict[str, dict] = {}
+
+    for path in files:
+        root = course_root(path)
+        manifest = manifests.get(root) or manifests.setdefault(root, Manifest(root))
+        entry = None if force else manifest.get(path, spec)
+        if entry and "applied" not in entry:
+            entry = None  # Written before applied ids were recorded; re-check it once.
+        if entry and manifest.is_current(path, spec, os.stat(path)):
+            results.append(FileResult(path, applied=list(entry["applied"]), skipped=True))
+            continue
+        if entry:
+            recorded[path] = entry
+        tasks.append((path, entry["output"] if entry else None))
+
+    txn = Transaction(transaction_roots[0], transaction_roots) if transaction_roots and not dry_run else None
+    options = {"dry_run": dry_run, "use_mmap": use_mmap, "txn_id": txn.id if txn else None}
+    if jobs == 1 or len(tasks) < 2:
+        results += [patch_file(p, patches, expected_sha256=e, **options) for p, e in tasks]
+    else:
+        jobs = jobs or os.cpu_count() or 1
+        chunksize = max(1, len(tasks) // (jobs * 4))
+        with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(patches, options)) as pool:
+            results += pool.map(_patch_one, tasks, chunksize=chunksize)
+    for r in results:
+        if r.skipped and r.path in recorded:
+            r.applied = list(recorded[r.path]["applied"])
+
+    if txn:
+        with span("commit", files=sum(1 for r in results if r.staged)):
+            _commit(txn, results)
+
+    if not dry_run:
+        with span("manifest"):
+            for r in results:
+                if r.output_sha256 and not r.error:
+                    manifest = manifests[course_root(r.path)]
+                    manifest.record(r.path, spec, r.input_sha256, r.output_sha256, r.applied)
+            for manifest in manifests.values():
+                manifest.save()
+
+    return sorted(results, key=lambda r: r.path)
+
+
+def unmatched_patches(patches: list[WidgetPatch], results: list[FileResult]) -> list[WidgetPatch]:
+    """Patches that applied to no chapter in `results` (a mistyped id or a guard that never holds)."""
+    hit = {widget_id for r in results for widget_id in r.applied}
+    return [p for p in patches if p.widget_id not in hit]
+
+
+def _commit(txn: Transaction, results: list[FileResult]) -> None:
+    staged = [r for r in results if r.staged]
+    for r in staged:
+        txn.add(r.path, r.staged, r.input_stat)
+
+    failures = sum(1 for r in results if r.error)
+    if failures:
+        txn.abort()
+        reason = f"not committed: {failures} chapter(s) in the batch failed"
+    else:
+        try:
+            txn.commit()
+            reason = None
+        except (OSError, TransactionError) as e:
+            reason = f"rolled back: {e}"
+
+    for r in staged:
+        if reason:
+            r.error = reason
+        else:
+            r.written = True
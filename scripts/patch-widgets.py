@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Apply a widget patch spec to every chapter under one or more output roots.
+
+Usage:
+  python3 scripts/patch-widgets.py scripts/fix-ch05-widgets.py ./output
+  python3 scripts/patch-widgets.py patches.json ./output/course-a ./output/course-b --jobs 8
+  python3 scripts/patch-widgets.py patches.json ./output --mmap
+  python3 scripts/patch-widgets.py patches.json ./output --trace trace/ --profile
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "lib"))
+
+import pipeline_trace  # noqa: E402
+from patch_txn import recover  # noqa: E402
+from widget_patch import find_chapters, load_spec, run_batch, unmatched_patches  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Apply a widget patch spec across chapter HTML.")
+    parser.add_argument("spec", help="Patch spec (.py defining PATCHES, or .json)")
+    parser.add_argument("roots", nargs="+", help="Output directories to search for chapters/*.html")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    parser.add_argument("--mmap", action="store_true",
+                        help="Memory-map chapters and copy untouched bytes file-to-file (for huge inline images)")
+    parser.add_argument("--force", action="store_true", help="Ignore patch manifests and re-check every chapter")
+    parser.add_argument("--no-transaction", action="store_true",
+                        help="Write each chapter as soon as it is patched instead of committing all-or-nothing")
+    pipeline_trace.add_arguments(parser)
+    args = parser.parse_args()
+
+    pipeline_trace.start(args)
+
+    for message in recover(args.roots):
+        print(message)
+
+    patches = load_spec(args.spec)
+    files = find_chapters(args.roots)
+    print(f"Spec: {args.spec} ({len(patches)} widget patch(es))")
+    print(f"Chapters: {len(files)}")
+
+    start = time.perf_counter()
+    results = run_batch(files, patches, jobs=args.jobs, dry_run=args.dry_run,
+                        use_mmap=args.mmap, force=args.force,
+                        transaction_roots=None if args.no_transaction else args.roots)
+    elapsed = time.perf_counter() - start
+
+    changed = [r for r in results if r.output_sha256 != r.input_sha256 and not r.error]
+    failed = [r for r in results if r.error]
+    skipped = [r for r in results if r.skipped]
+    for r in changed:
+        print(f"  {'would patch' if args.dry_run else 'patched'} {r.path}: {', '.join(r.applied)}")
+    for r in failed:
+        print(f"  FAILED {r.path}: {r.error}", file=sys.stderr)
+    unmatched = unmatched_patches(patches, results)
+    for p in unmatched:
+        reason = f"no chapter has #{p.widget_id}" + (f" containing {p.expect!r}" if p.expect else "")
+        print(f"  NOT APPLIED #{p.widget_id}: {reason}", file=sys.stderr)
+
+    print("")
+    print(f"Done! {len(changed)} patched, {len(failed)} failed, {len(skipped)} skipped (up to date), "
+          f"{len(results) - len(changed) - len(failed) - len(skipped)} unchanged, "
+          f"{len(unmatched)} patch(es) applied nowhere in {elapsed:.2f}s")
+    pipeline_trace.report(args)
+    return 1 if failed or unmatched else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
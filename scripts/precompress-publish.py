@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Write precompressed .gz (and .br, if the brotli package is installed) siblings
+for every text asset in publish/, so a static host can serve them as-is.
+
+Run last: after publish-course.ts, widget patches, extract-images.py and
+hoist-theme-css.py. Files unchanged since the previous run are skipped.
+
+Usage:
+  python3 scripts/precompress-publish.py ./output/prejudice_v2
+  python3 scripts/precompress-publish.py ./output --jobs 8 --force
+  python3 scripts/precompress-publish.py ./output --force --trace trace/ --profile
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "lib"))
+
+import pipeline_trace  # noqa: E402
+from build_state import find_publish_dirs  # noqa: E402
+from precompress import Manifest, available_encodings, compress_file, find_assets  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Precompress text assets in publish/ directories.")
+    parser.add_argument("roots", nargs="+", help="Course output directories (or parents of them)")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--gzip-level", type=int, default=9, help="gzip level 1-9 (default: 9)")
+    parser.add_argument("--brotli-level", type=int, default=11, help="Brotli quality 0-11 (default: 11)")
+    parser.add_argument("--force", action="store_true", help="Recompress every file, ignoring the manifest")
+    pipeline_trace.add_arguments(parser)
+    args = parser.parse_args()
+
+    pipeline_trace.start(args)
+
+    encodings = available_encodings()
+    if "br" not in encodings:
+        print("  brotli package not installed; writing .gz only (pip install brotli for .br)")
+
+    start = time.perf_counter()
+    results = []
+    skipped = pruned = 0
+    with ProcessPoolExecutor(args.jobs) as pool:
+        for publish_dir in find_publish_dirs(args.roots):
+            manifest = Manifest(publish_dir)
+            assets = find_assets(publish_dir)
+            pruned += len(manifest.prune({manifest.key(p) for p in assets}))
+
+            todo = []
+            for path in assets:
+                if not args.force and manifest.is_current(path, encodings):
+                    skipped += 1
+                else:
+                    todo.append(path)
+
+            previous = [None if args.force else manifest.get(p) for p in todo]
+            n = len(todo)
+            for result in pool.map(compress_file, todo, [encodings] * n, previous,
+                                   [args.gzip_level] * n, [args.brotli_level] * n):
+                if not result.error:
+                    manifest.record(result)
+                results.append(result)
+            manifest.save()
+    elapsed = time.perf_counter() - start
+
+    failed = [r for r in results if r.error]
+    compressed = [r for r in results if r.compressed]
+    for r in failed:
+        print(f"  FAILED {r.path}: {r.error}", file=sys.stderr)
+
+    before = sum(r.size for r in compressed)
+    after = {enc: sum(r.encodings.get(enc, 0) for r in compressed) for enc in encodings}
+    sizes = ", ".join(f"{enc} {after[enc]:,}" for enc in encodings)
+    print("")
+    print(f"Done! {len(compressed)} compressed ({before:,} bytes -> {sizes}), "
+          f"{len(results) - len(compressed) - len(failed) + skipped} unchanged, "
+          f"{pruned} stale sibling(s) removed, {len(failed)} failed in {elapsed:.2f}s")
+    pipeline_trace.report(args)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Re-stitch and re-level chapter audiobooks in a course's audio/ directory.
+
+This only has something to work on when WAV audio was left on disk: the
+generators transcode each chapter to MP3 and delete the WAV whenever ffmpeg is
+installed, and MP3s are not read. Run it on courses built without ffmpeg, then
+transcode the resulting WAVs as generate-course.ts does.
+
+Chunk files (audio/01_chunk00.wav, audio/01_chunk01.pcm, ...) are joined with
+the same 80 ms equal-power crossfade tts.ts uses and written to audio/01.wav.
+Nothing in the generators writes chunk files today (tts.ts stitches in
+memory), so they only exist if you save them yourself. A chapter with only
+audio/01.wav is re-leveled in place. Chunk files are kept, so a chapter can be
+re-stitched with different settings later.
+
+Requires numpy (pip install -r scripts/requirements.txt).
+
+Usage:
+  python3 scripts/stitch-audio.py ./output/prejudice_v2
+  python3 scripts/stitch-audio.py ./output --target-dbfs -18 --crossfade-ms 120
+  python3 scripts/stitch-audio.py ./output --trace trace/ --trace-heap
+  python3 scripts/stitch-audio.py ./output/prejudice_v2 --book ./output/prejudice_v2/audio/course.wav
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "lib"))
+
+import pipeline_trace  # noqa: E402
+from audio_stitch import (  # noqa: E402
+    CROSSFADE_MS,
+    chapter_inputs,
+    find_audio_dirs,
+    open_source,
+    stitch,
+    stitch_chapter,
+)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Stitch and level chapter audio with NumPy.")
+    parser.add_argument("roots", nargs="+", help="Course output directories (or parents of them)")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--crossfade-ms", type=float, default=CROSSFADE_MS,
+                        help=f"Crossfade at chunk boundaries (default: {CROSSFADE_MS})")
+    parser.add_argument("--target-dbfs", type=float, default=-20.0, help="RMS level to normalize to (default: -20)")
+    parser.add_argument("--no-normalize", action="store_true", help="Keep the original level")
+    parser.add_argument("--book", help="Also write every stitched chapter, in order, into this one WAV")
+    parser.add_argument("--gap-ms", type=float, default=1500, help="Silence between chapters in --book (default: 1500)")
+    pipeline_trace.add_arguments(parser)
+    args = parser.parse_args()
+
+    pipeline_trace.start(args)
+
+    tasks = []
+    for audio_dir in find_audio_dirs(args.roots):
+        for prefix, inputs in chapter_inputs(audio_dir).items():
+            tasks.append((prefix, inputs, os.path.join(audio_dir, f"{prefix}.wav")))
+    if not tasks:
+        print("No chapter audio found.")
+        return 0
+
+    target = None if args.no_normalize else args.target_dbfs
+    start = time.perf_counter()
+    with ProcessPoolExecutor(args.jobs) as pool:
+        results = list(pool.map(
+            stitch_chapter, *zip(*tasks), [args.crossfade_ms] * len(tasks), [target] * len(tasks),
+        ))
+
+    failed = [r for r in results if r.error]
+    for r in results:
+        if not r.error:
+            print(f"  {r.dest}: {len(r.inputs)} input(s), {r.seconds / 60:.1f} min, gain {r.gain_db:+.1f} dB")
+    for r in failed:
+        print(f"  FAILED {r.dest}: {r.error}", file=sys.stderr)
+
+    if args.book and not failed:
+        sources = [open_source(r.dest) for r in results]
+        gap = int(args.gap_ms / 1000 * sources[0].sample_rate)
+        frames = stitch(sources, args.book, gap_frames=gap)
+        print(f"  {args.book}: {len(sources)} chapter(s), {frames / sources[0].sample_rate / 60:.1f} min")
+
+    print("")
+    total = sum(r.seconds for r in results)
+    print(f"Done! Stitched {len(results) - len(failed)} chapter(s) ({total / 60:.1f} min of audio), "
+          f"{len(failed)} failed in {time.perf_counter() - start:.2f}s")
+    pipeline_trace.report(args)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
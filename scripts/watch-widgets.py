@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Keep widget patch specs applied while chapters are being regenerated.
+
+Watches one or more output roots (inotify on Linux, polling elsewhere or with
+--poll). Whenever a chapters/*.html file is rewritten and has settled, every
+spec whose widget ids appear in it is re-applied. On start-up, and whenever a
+spec file is edited, the affected specs are applied across all chapters once.
+Stop with Ctrl-C.
+
+Usage:
+  python3 scripts/watch-widgets.py ./output --spec scripts/fix-ch05-widgets.py
+  python3 scripts/watch-widgets.py ./output/a ./output/b --spec a.json --spec b.py --poll --interval 2
+"""
+
+import argparse
+import os
+import signal
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "lib"))
+
+from chapter_watch import ChapterWatcher, WatchEvent, open_source  # noqa: E402
+from patch_txn import recover  # noqa: E402
+
+
+def report(event: WatchEvent) -> int:
+    patched = 0
+    for spec, r in event.results:
+        if r.error:
+            print(f"  FAILED {event.path} ({os.path.basename(spec)}): {r.error}", file=sys.stderr)
+        elif r.written:
+            patched += 1
+            print(f"  patched {event.path} ({os.path.basename(spec)}): {', '.join(r.applied)} "
+                  f"in {event.elapsed * 1000:.1f} ms")
+    if event.error:
+        print(f"  FAILED {event.path}: {event.error}", file=sys.stderr)
+    return patched
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Re-apply widget patch specs as chapters change.")
+    parser.add_argument("roots", nargs="+", help="Output directories to watch")
+    parser.add_argument("--spec", action="append", required=True,
+                        help="Patch spec (.py defining PATCHES, or .json); repeat for several")
+    parser.add_argument("--debounce-ms", type=float, default=300,
+                        help="Wait this long after a chapter's last write before patching (default: 300)")
+    parser.add_argument("--poll", action="store_true", help="Poll file stats instead of using inotify")
+    parser.add_argument("--interval", type=float, default=1.0, help="Polling interval in seconds (default: 1)")
+    parser.add_argument("--mmap", action="store_true", help="Memory-map chapters while patching")
+    parser.add_argument("--no-initial", action="store_true", help="Skip the start-up pass over existing chapters")
+    args = parser.parse_args()
+
+    for message in recover(args.roots):
+        print(message)
+
+    watcher = ChapterWatcher(args.spec, args.roots, debounce=args.debounce_ms / 1000, use_mmap=args.mmap)
+    source = open_source(args.roots, poll=args.poll, interval=args.interval)
+    for spec in watcher.specs:
+        print(f"Spec: {spec.path} ({len(spec.patches)} widget patch(es))")
+    print(f"Watching {', '.join(args.roots)} ({source.name})")
+
+    patched = 0
+    if not args.no_initial:
+        patched += sum(report(e) for e in watcher.catch_up())
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    start = time.perf_counter()
+    try:
+        while True:
+            timeout = watcher.debounce if watcher.pending else 1.0
+            watcher.notice(source.wait(timeout))
+            reloaded, failed = watcher.reload_specs()
+            for path, error in failed:
+                print(f"  FAILED to reload {path}, keeping the previous version: {error}", file=sys.stderr)
+            for spec in reloaded:
+                print(f"Reloaded {spec.path} ({len(spec.patches)} widget patch(es))")
+                patched += sum(report(e) for e in watcher.catch_up([spec]))
+            for path in watcher.due():
+                patched += report(watcher.apply(path))
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        source.close()
+
+    print("")
+    print(f"Done! {patched} chapter patch(es) applied over {time.perf_counter() - start:.0f}s of watching")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
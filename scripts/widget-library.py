@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Build and query a deduplicated SQLite library of every widget in a set of
+generated courses.
+
+Usage:
+  python3 scripts/widget-library.py build ./output --db widgets.sqlite
+  python3 scripts/widget-library.py build ./output --db widgets.sqlite --trace trace/ --profile
+  python3 scripts/widget-library.py grep dr-rate-btn --db widgets.sqlite
+  python3 scripts/widget-library.py dupes --db widgets.sqlite
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "lib"))
+
+import pipeline_trace  # noqa: E402
+from widget_library import build_library, duplicates, grep  # noqa: E402
+from widget_patch import find_chapters  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Deduplicated widget library across courses.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    # Shared by every subcommand, so --db goes after the command name.
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--db", default="widgets.sqlite", help="Library database (default: widgets.sqlite)")
+
+    build = sub.add_parser("build", parents=[common], help="Extract widgets from chapters/*.html under the given roots")
+    build.add_argument("roots", nargs="+")
+    build.add_argument("--jobs", "-j", type=int, default=None, help="Worker processes (default: CPU count)")
+    pipeline_trace.add_arguments(build)
+
+    find = sub.add_parser("grep", parents=[common], help="List widgets whose HTML or JS contains a string")
+    find.add_argument("needle")
+
+    dupes = sub.add_parser("dupes", parents=[common], help="List widgets duplicated across chapters")
+    dupes.add_argument("--min", type=int, default=2, help="Minimum number of copies (default: 2)")
+
+    args = parser.parse_args()
+    start = time.perf_counter()
+
+    if args.command != "build" and not os.path.isfile(args.db):
+        # sqlite3.connect would silently create an empty library and report no matches.
+        print(f"No widget library at {args.db}; run the build command first.", file=sys.stderr)
+        return 1
+
+    if args.command == "build":
+        pipeline_trace.start(args)
+        files = find_chapters(args.roots)
+        extracted, skipped = build_library(args.db, files, args.jobs)
+        print(f"Done! Extracted {extracted} chapter(s), {skipped} unchanged, "
+              f"into {args.db} in {time.perf_counter() - start:.2f}s")
+        pipeline_trace.report(args)
+
+    elif args.command == "grep":
+        rows = grep(args.db, args.needle)
+        for course, chapter, widget_id, title, digest, size in rows:
+            print(f"{course}  {os.path.basename(chapter)}  #{widget_id}  {title or ''}  "
+                  f"{digest[:12]}  {size:,} bytes")
+        print(f"{len(rows)} match(es) in {time.perf_counter() - start:.3f}s", file=sys.stderr)
+
+    else:
+        for digest, copies, widget_id, title, size in duplicates(args.db, args.min):
+            print(f"{copies:5d} x  {digest[:12]}  #{widget_id}  {title or ''}  {size:,} bytes")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())